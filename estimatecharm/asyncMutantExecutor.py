@@ -0,0 +1,160 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+An executor driven by asyncio, kept apart from mutantExecutor since its
+syntax needs Python 3.5 or newer.
+"""
+
+from logging import debug, info, warning, error
+import os, sys, json
+import asyncio
+
+from estimatecharm.mutantExecutor import *
+
+# The directory holding the estimatecharm package, for children to import
+# it from even when it isn't installed or in their working directory.
+packageParent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class asyncExecutor(processExecutor):
+    """
+    Run mutants as fresh interpreters started by an asyncio event loop,
+    up to concurrency at once. Each child reports its result as JSON on a
+    pipe of its own, so its stdout and stderr are left alone, and runs in
+    a session of its own, so it can be killed with everything it started.
+    """
+
+    def __init__(self, timeout=10, activate=None, store=None, limits=None,
+                 output="discard", concurrency=8):
+        super(asyncExecutor, self).__init__(timeout, activate, store, limits, output)
+        self.concurrency = concurrency
+        self.loop = None
+
+    def start(self):
+        super(asyncExecutor, self).start()
+        self.loop = asyncio.new_event_loop()
+
+    def childEnvironment(self):
+        environ = dict(os.environ)
+        paths = [path for path in environ.get("PYTHONPATH", "").split(os.pathsep) if path]
+        environ["PYTHONPATH"] = os.pathsep.join([packageParent] + paths)
+        if self.activation is not None:
+          environ["ESTIMATECHARM_ACTIVATION"] = json.dumps(self.activation)
+        if self.limits:
+          environ["ESTIMATECHARM_LIMITS"] = json.dumps(self.limits)
+        environ["ESTIMATECHARM_OUTPUT"] = json.dumps(self.output)
+        return environ
+
+    async def runAsync(self, path):
+        (readEnd, writeEnd) = os.pipe()
+        reader = asyncio.StreamReader()
+        (transport, _) = await self.loop.connect_read_pipe(
+          lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(readEnd, 'rb'))
+        try:
+          child = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "estimatecharm.mutantChild", str(writeEnd), path,
+            pass_fds=(writeEnd,), env=self.childEnvironment(),
+            start_new_session=True)
+          os.close(writeEnd)
+          writeEnd = None
+          async def finish():
+            # Anything the child started may hold the pipe open: once the
+            # child exits, kill its session so the read sees the end.
+            reading = self.loop.create_task(reader.read())
+            try:
+              await child.wait()
+              killGroup(child.pid)
+              return await reading
+            finally:
+              reading.cancel()
+          try:
+            data = await asyncio.wait_for(finish(), self.timeout)
+          except asyncio.TimeoutError:
+            killGroup(child.pid)
+            await child.wait()
+            return didntHalt(path)
+          except asyncio.CancelledError:
+            killGroup(child.pid)
+            await child.wait()
+            raise
+        finally:
+          if writeEnd is not None:
+            os.close(writeEnd)
+          transport.close()
+        if len(data) == 0:
+          if child.returncode < 0:
+            return diedResult(path, -child.returncode, self.limits)
+          if child.returncode > 0:
+            # Not the mutant's doing: the child couldn't run it at all.
+            raise RuntimeError("Mutant runner exited with status %i without a result for %s"
+                               % (child.returncode, path))
+          return didntHalt(path)
+        return takeOutput(unpackResult(json.loads(data.decode('utf-8'))), path)
+
+    def run(self, path, preload=()):
+        return self.loop.run_until_complete(self.runAsync(path))
+
+    async def tagged(self, tag, path):
+        return (tag, path, await self.runAsync(path))
+
+    def stream(self, mutants, preload=()):
+        """
+        Run mutants concurrently, yielding them as they finish. If the
+        stream is closed early, the ones still running are killed.
+        """
+        mutants = iter(mutants)
+        running = set()
+        paths = dict()
+        done = list()
+        exhausted = False
+        try:
+          while True:
+            while not exhausted and len(running) < self.concurrency:
+              try:
+                (source, tag) = next(mutants)
+              except StopIteration:
+                exhausted = True
+                break
+              path = self.store.write(source)
+              task = self.loop.create_task(self.tagged(tag, path))
+              paths[task] = path
+              running.add(task)
+            if len(running) == 0:
+              return
+            (done, running) = self.loop.run_until_complete(
+              asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED))
+            done = list(done)
+            while len(done) > 0:
+              task = done.pop()
+              (tag, path, r) = task.result()
+              self.store.remove(paths.pop(task))
+              yield (tag, path, r)
+        finally:
+          for task in done:
+            self.store.remove(paths.pop(task))
+          for task in running:
+            task.cancel()
+          if len(running) > 0:
+            self.loop.run_until_complete(asyncio.wait(running))
+          for task in running:
+            self.store.remove(paths.pop(task))
+
+    def release(self):
+        if self.loop is not None:
+          self.loop.close()
+          self.loop = None
+        super(asyncExecutor, self).release()
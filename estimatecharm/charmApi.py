@@ -0,0 +1,91 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Charm estimation as a library call. Input comes as paths or as source
+strings, results come back as per-line arrays, and nothing is written but
+the mutants themselves, which go to memfd files where the platform has
+them, unless a results or details file is asked for.
+"""
+
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import estimateCharm, detailColumns, REPLACE
+from estimatecharm.pythonSource import pythonSource
+from estimatecharm.mutantExecutor import processExecutor, openMutantStore
+
+class charmResult(object):
+    """
+    Per-line results for one input. mutants, errors and charm are arrays
+    indexed by line number: index 0 is unused and errors[lines+1] counts
+    errors that couldn't be placed on a line.
+    """
+
+    def __init__(self, stats):
+        self.path = stats.path
+        self.lines = stats.lines
+        self.mutants = stats.progress
+        self.errors = stats.errors
+        self.charm = stats.charm
+        self.mutations = stats.mutations
+        self.delta = stats.delta
+
+    def __repr__(self):
+        return "charmResult(%r, %i lines, %i mutants, delta %.3f)" % (
+          self.path, self.lines, self.mutations, self.delta)
+
+def inputs(paths, sources):
+    for path in paths:
+      yield path
+    for (name, source) in sorted(sources.items()):
+      yield (name, source)
+
+def iterEstimate(paths=(), sources={}, deltamax=0.1, mutation=REPLACE,
+                 details=False, executor=None, language=pythonSource,
+                 results=None, detailsFile=None, **options):
+    """
+    Estimate charm for the files at paths and the source strings in the
+    dict sources, keyed by the name to report them under. Yields a
+    charmResult as each input is finished and, if details is on, a tuple
+    for every mutant as it's counted, with the fields in detailColumns.
+    Inputs that don't run unmutated are left out, with a warning.
+    Results and details files are only written if results or detailsFile
+    name them. Other options go to estimateCharm.
+    """
+    if executor is None:
+      executor = processExecutor(store=openMutantStore("memfd"))
+    v = estimateCharm(source=inputs(paths, sources),
+                      language=language,
+                      results=results,
+                      details=detailsFile,
+                      executor=executor,
+                      **options)
+    try:
+      for record in v.estimating(mutation, deltamax, details):
+        if isinstance(record, tuple):
+          yield record
+        else:
+          yield charmResult(record)
+      v.reportFailures()
+      v.reportCopies()
+    finally:
+      v.release()
+
+def estimate(paths=(), sources={}, deltamax=0.1, **options):
+    """Like iterEstimate, without details, returning the charmResults in a list."""
+    options['details'] = False
+    return list(iterEstimate(paths, sources, deltamax, **options))
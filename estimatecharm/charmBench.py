@@ -0,0 +1,306 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+End-to-end benchmarks over synthetic corpora: how mutants per second and
+the time to converge scale with file size, number of files, the shape of
+the code, the mutation operator, the executor and the number of workers.
+Every case runs in a process of its own, so its peak RSS is its own, with
+a fixed seed, and its results are appended to a JSON lines file that runs
+of other versions can be compared with.
+"""
+
+from logging import debug, info, warning, error
+import logging
+import os, sys, json, time, random, shutil, platform, argparse, resource
+from itertools import product
+from multiprocessing import Process, Pipe, cpu_count
+from tempfile import mkdtemp
+
+from estimatecharm import __version__
+from estimatecharm.estimateCharm import *
+
+def flatModule(rng, lines):
+    """Straight line integer assignments, mostly using a value from before."""
+    out = list()
+    for i in range(0, lines):
+      kind = rng.randint(0, 3)
+      if i == 0 or kind == 0:
+        out.append("v%i = %i" % (i, rng.randint(0, 100)))
+      elif kind == 1:
+        out.append("v%i = v%i + %i" % (i, rng.randint(0, i-1), rng.randint(1, 9)))
+      elif kind == 2:
+        out.append("v%i = max(v%i, %i)" % (i, rng.randint(0, i-1), rng.randint(0, 100)))
+      else:
+        out.append("v%i = len(str(v%i))" % (i, rng.randint(0, i-1)))
+    return out
+
+def nestedModule(rng, lines, maxDepth=8):
+    """Loops and conditionals nested up to maxDepth deep, every body run."""
+    out = ["total = 0"]
+    depth = 0
+    while len(out) < lines:
+      indent = "    " * depth
+      r = rng.random()
+      if depth < maxDepth and r < 0.4:
+        if rng.random() < 0.5:
+          out.append(indent + "for i%i in range(2):" % (depth))
+        else:
+          out.append(indent + "if total >= 0:")
+        depth = depth + 1
+        out.append("    " * depth + "total = total + %i" % (rng.randint(1, 9)))
+      elif depth > 0 and r < 0.7:
+        depth = depth - 1
+      else:
+        out.append(indent + "total = total * 2 % 1000003")
+    return out
+
+heavyModules = ["json", "decimal", "fractions", "email.mime.text",
+                "xml.dom.minidom", "http.client", "argparse", "unittest",
+                "asyncio", "sqlite3", "difflib", "statistics", "ipaddress",
+                "pathlib", "zipfile", "csv", "logging", "datetime",
+                "textwrap", "tarfile"]
+
+def importModule(rng, lines):
+    """Imports of standard modules that are slow to load, then flat code."""
+    modules = rng.sample(heavyModules, min(len(heavyModules), max(1, lines // 4)))
+    out = ["import %s" % (module) for module in modules]
+    out.extend("n%i = len(dir(%s))" % (i, module) for (i, module) in enumerate(modules))
+    out.extend(flatModule(rng, lines - len(out)))
+    return out
+
+def loopModule(rng, lines):
+    """Counting loops and recursion, which mutants easily keep from halting."""
+    out = list()
+    i = 0
+    while len(out) < lines:
+      n = rng.randint(2, 20)
+      kind = rng.randint(0, 2)
+      if kind == 0:
+        out.extend(["i%i = 0" % (i), "while i%i < %i:" % (i, n), "    i%i = i%i + 1" % (i, i)])
+      elif kind == 1:
+        out.extend(["j%i = %i" % (i, n), "while j%i != 0:" % (i), "    j%i = j%i - 1" % (i, i)])
+      else:
+        out.extend(["def r%i(k):" % (i), "    if k <= 0:", "        return 0",
+                    "    return r%i(k - 1) + 1" % (i), "r%i(%i)" % (i, n)])
+      i = i + 1
+    return out
+
+shapes = {
+  "flat": flatModule,
+  "nested": nestedModule,
+  "imports": importModule,
+  "loops": loopModule,
+}
+
+# Operators other than replace can't be aimed at a line, so they are only
+# run through their mutant spaces, as with --exhaustive sample.
+operators = {
+  "replace": REPLACE,
+  "delete": DELETE,
+  "punctuation": PUNCTUATION,
+  "deletewordchar": DELETEWORDCHAR,
+  "deletenumchar": DELETENUMCHAR,
+  "deletepunctchar": DELETEPUNCTCHAR,
+  "colon": COLON,
+}
+
+# What makes two results the same case, for comparing them.
+caseKeys = ["shape", "files", "lines", "operator", "executor", "workers",
+            "exhaustive", "deltamax", "timeout", "seed"]
+
+def writeCorpus(directory, shape, files, lines, seed):
+    """
+    Write files modules of about lines lines each in the given shape to
+    directory, returning their paths. No two are the same, so none are
+    estimated as copies of another.
+    """
+    rng = random.Random(seed)
+    paths = list()
+    for i in range(0, files):
+      path = os.path.join(directory, "%s%04i.py" % (shape, i))
+      with open(path, "w") as f:
+        f.write("# %s %i\n" % (shape, i))
+        f.write("\n".join(shapes[shape](rng, lines)) + "\n")
+      paths.append(path)
+    return paths
+
+def benchWorker(address, executor, seed):
+    random.seed(seed)
+    runWorker(address, executor)
+
+def peakRss(who):
+    """Peak resident memory in MiB of this process or of its largest child."""
+    return resource.getrusage(who).ru_maxrss / 1024.0
+
+def measure(case):
+    """
+    Run one case here and now, returning it with its results: mutants per
+    second until the last file converged, when that was and the median
+    time a file took, and the peak RSS of this process and of its largest
+    child (a mutant, or the zygote).
+    """
+    directory = mkdtemp(prefix="charmbench")
+    try:
+      paths = writeCorpus(directory, case['shape'], case['files'], case['lines'], case['seed'])
+      random.seed(case['seed'])
+      executor = dict(kind=case['executor'], store="memfd", timeout=case['timeout'])
+      mutation = operators[case['operator']]
+      start = time.time()
+      v = estimateCharm(source=paths, tempDir=directory, executor=makeExecutor(**executor),
+                        exhaustive=case['exhaustive'])
+      finished = list()
+      try:
+        if case['workers'] == 0:
+          for stats in v.estimating(mutation, case['deltamax']):
+            finished.append(time.time() - start)
+        else:
+          coordinator = charmCoordinator(v)
+          coordinator.start()
+          workers = [Process(target=benchWorker, args=(coordinator.address, executor, case['seed'] + i + 1))
+                     for i in range(0, case['workers'])]
+          for worker in workers:
+            worker.start()
+          coordinator.estimate(mutation, case['deltamax'])
+          finished.append(time.time() - start)
+          coordinator.release()
+          for worker in workers:
+            worker.join()
+      finally:
+        v.release()
+      seconds = time.time() - start
+      converged = finished[-1] if len(finished) > 0 else seconds
+      perFile = sorted(b - a for (a, b) in zip([0.0] + finished, finished))
+      return dict(
+        case,
+        version=__version__,
+        python=platform.python_version(),
+        machine=platform.machine(),
+        cpus=cpu_count(),
+        when=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        estimated=len(v.stats),
+        mutants=v.metrics.mutants,
+        inferred=v.metrics.inferred,
+        halting=v.metrics.halted,
+        seconds=seconds,
+        mutantsPerSecond=v.metrics.mutants / max(converged, 1e-9),
+        convergedSeconds=converged,
+        medianFileSeconds=perFile[len(perFile) // 2] if len(perFile) > 0 else None,
+        peakRssMiB=peakRss(resource.RUSAGE_SELF),
+        childPeakRssMiB=peakRss(resource.RUSAGE_CHILDREN),
+        )
+    finally:
+      shutil.rmtree(directory, True)
+
+def measureInto(conn, case):
+    try:
+      conn.send(measure(case))
+    except Exception as e:
+      conn.send(dict(case, error="%s: %s" % (type(e).__name__, e)))
+    conn.close()
+
+def run(case):
+    """Run one case in a process of its own, returning its results."""
+    (receiver, sender) = Pipe(False)
+    p = Process(target=measureInto, args=(sender, case))
+    p.start()
+    sender.close()
+    try:
+      result = receiver.recv()
+    except EOFError:
+      result = dict(case, error="died with exit code %s" % (p.exitcode))
+    p.join()
+    return result
+
+def caseKey(result):
+    return tuple(result.get(key, None) for key in caseKeys)
+
+def readResults(path):
+    """The last result for each case in a results file."""
+    results = dict()
+    with open(path) as f:
+      for line in f:
+        if len(line.strip()) > 0:
+          result = json.loads(line)
+          if 'error' not in result:
+            results[caseKey(result)] = result
+    return results
+
+def compare(result, earlier, tolerance):
+    """
+    The ratio of result's mutants per second to an earlier run's of the
+    same case, or None if there isn't one, and whether it's a regression:
+    slower by more than tolerance.
+    """
+    before = earlier.get(caseKey(result), None)
+    if before is None or 'error' in result or before['mutantsPerSecond'] <= 0:
+      return (None, False)
+    ratio = result['mutantsPerSecond'] / before['mutantsPerSecond']
+    return (ratio, ratio < 1.0 - tolerance)
+
+def cases(args):
+    for (shape, files, lines, operator, executor, workers) in product(
+        args.shape, args.files, args.lines, args.operator, args.executor, args.workers):
+      exhaustive = args.exhaustive if operator == "replace" else "sample"
+      for repeat in range(0, args.repeat):
+        yield dict(shape=shape, files=files, lines=lines, operator=operator,
+                   executor=executor, workers=workers, exhaustive=exhaustive,
+                   deltamax=args.maximum_error, timeout=args.mutant_timeout,
+                   seed=args.seed + repeat)
+
+def main():
+        parser=argparse.ArgumentParser(description="Benchmarks estimatecharm end to end over synthetic corpora.")
+        parser.add_argument("-s", "--shape", help="Shapes of code to generate", nargs="+", choices=sorted(shapes.keys()), default=["flat"])
+        parser.add_argument("-f", "--files", help="Numbers of files per corpus", nargs="+", type=int, default=[4])
+        parser.add_argument("-n", "--lines", help="Numbers of lines per file", nargs="+", type=int, default=[20])
+        parser.add_argument("-O", "--operator", help="Mutation operators", nargs="+", choices=sorted(operators.keys()), default=["replace"])
+        parser.add_argument("-x", "--executor", help="Executors to run mutants with", nargs="+", choices=sorted(executors.keys()), default=["process"])
+        parser.add_argument("-W", "--workers", help="Numbers of local workers (0 estimates without a coordinator)", nargs="+", type=int, default=[0])
+        parser.add_argument("-e", "--maximum-error", help="Maximum error to estimate every file to", default=0.5, type=float)
+        parser.add_argument("--exhaustive", help="As for estimatecharm, for the replace operator", choices=["off", "sample"], default="off")
+        parser.add_argument("--mutant-timeout", help="Seconds before a mutant is taken not to halt", default=2.0, type=float)
+        parser.add_argument("--seed", help="Seed for generating corpora and mutants", default=1, type=int)
+        parser.add_argument("-r", "--repeat", help="Times to run each case, with consecutive seeds", default=1, type=int)
+        parser.add_argument("-o", "--results-file", help="JSON lines file to append results to", default="bench.jsonl")
+        parser.add_argument("-c", "--compare", help="Earlier results file to compare mutants per second with, exiting with status 1 on a regression", default=None)
+        parser.add_argument("--tolerance", help="How much slower than --compare counts as a regression", default=0.1, type=float)
+        args = parser.parse_args()
+        logging.getLogger().setLevel(logging.WARNING)
+        earlier = dict() if args.compare is None else readResults(args.compare)
+        regressions = 0
+        print("%-8s %5s %5s %-12s %-8s %3s %9s %9s %9s %9s  %s" % (
+          "shape", "files", "lines", "operator", "executor", "wrk", "mutants", "mut/s", "converge", "rss MiB", "vs earlier"))
+        for case in cases(args):
+          result = run(case)
+          with open(args.results_file, 'a') as f:
+            f.write(json.dumps(result, sort_keys=True) + "\n")
+          if 'error' in result:
+            print("%-8s %5i %5i %-12s %-8s %3i  failed: %s" % (
+              case['shape'], case['files'], case['lines'], case['operator'], case['executor'], case['workers'], result['error']))
+            continue
+          (ratio, regressed) = compare(result, earlier, args.tolerance)
+          if regressed:
+            regressions = regressions + 1
+          print("%-8s %5i %5i %-12s %-8s %3i %9i %9.1f %9.2f %9.1f  %s" % (
+            case['shape'], case['files'], case['lines'], case['operator'], case['executor'], case['workers'],
+            result['mutants'], result['mutantsPerSecond'], result['convergedSeconds'], result['peakRssMiB'],
+            "" if ratio is None else "%.2fx%s" % (ratio, " REGRESSION" if regressed else "")))
+        if regressions > 0:
+          sys.exit(1)
+
+if __name__ == '__main__':
+    main()
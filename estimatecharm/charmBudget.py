@@ -0,0 +1,172 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A wall-clock time budget for a whole corpus, spread over its files so the
+worst per-line error at the end is as small as the time allows.
+"""
+
+from logging import debug, info, warning, error
+from threading import Lock
+import math
+import time
+
+def inputPath(name):
+    return name[0] if isinstance(name, tuple) else name
+
+class charmBudget(object):
+    """
+    Spends at most seconds, from when the inputs are listed, on estimating
+    them. Delta only depends on how many mutants a file got per line, so
+    the worst delta is smallest when every file gets the same number per
+    line. When a file starts, and every interval seconds while it runs,
+    the time left is spread over it and the files after it so that they'd
+    all get the same number: the file's allotment is what that comes to
+    for it. The file's own seconds per mutant are measured as it runs;
+    the files after it are expected to take the mean so far, which counts
+    loading them too, and to have as many lines as the files reached so
+    far, since they aren't read until the corpus gets to them. Once the
+    time is up, the file being estimated is finished with what it has and
+    the ones after it aren't estimated. Inputs that won't get mutants
+    (copies of earlier inputs, unchanged files and those that don't run)
+    stop being counted among the files after it once they are loaded.
+    """
+
+    def __init__(self, seconds, interval=1.0, clock=time.time):
+        self.seconds = seconds
+        self.interval = interval
+        self.clock = clock
+        self.begun = None
+        self.deadline = None
+        # The inputs, how many were reached, how many after those are
+        # still counted and the lines of the reached ones that were.
+        self.names = list()
+        self.positions = dict()
+        self.discounted = set()
+        self.next = 0
+        self.ahead = 0
+        self.reachedFiles = 0
+        self.reachedLines = 0
+        self.lock = Lock()
+        self.mutants = 0
+        # stats, start time, mutations at start, allotment, when planned.
+        self.current = None
+
+    def scan(self, inputs):
+        """Start the clock and list inputs, without reading them, returning them as a list."""
+        self.begun = self.clock()
+        self.deadline = self.begun + self.seconds
+        self.names = list(inputs)
+        for (i, name) in enumerate(self.names):
+          self.positions.setdefault(inputPath(name), i)
+        self.ahead = len(self.names)
+        info("Time budget of %.0f seconds for %i input files" % (self.seconds, len(self.names)))
+        return self.names
+
+    def expired(self):
+        return self.clock() >= self.deadline
+
+    def unreached(self):
+        """How many inputs weren't reached."""
+        return len(self.names) - self.next
+
+    def reach(self, path, lines=None):
+        """Note that the corpus has got to the input at path, which has lines if it's loaded."""
+        with self.lock:
+          for i in range(self.next, len(self.names)):
+            if inputPath(self.names[i]) == path:
+              for j in range(self.next, i+1):
+                if j not in self.discounted:
+                  self.ahead = self.ahead - 1
+              self.next = i + 1
+              if lines is not None and i not in self.discounted:
+                self.reachedFiles = self.reachedFiles + 1
+                self.reachedLines = self.reachedLines + lines
+              return
+
+    def remainingLines(self):
+        """The lines expected in the counted inputs not reached yet."""
+        with self.lock:
+          if self.reachedFiles == 0:
+            return 0.0
+          return self.ahead * float(self.reachedLines) / self.reachedFiles
+
+    def discount(self, path):
+        """Stop counting the input at path, which won't get mutants, as work to come."""
+        with self.lock:
+          i = self.positions.get(path, None)
+          if i is None or i < self.next or i in self.discounted:
+            return
+          self.discounted.add(i)
+          self.ahead = self.ahead - 1
+
+    def recorded(self):
+        """Count a mutant run."""
+        self.mutants = self.mutants + 1
+
+    def plan(self, stats, perMutant=None):
+        """
+        Mutants per line for stats' file and every file after it, given
+        perMutant, the seconds a mutant of stats' file takes (the mean if
+        None), or None before any mutant was run.
+        """
+        now = self.clock()
+        if self.mutants == 0:
+          return None
+        mean = (now - self.begun) / self.mutants
+        if perMutant is None:
+          perMutant = mean
+        left = self.deadline - now
+        l = float(stats.lines)
+        m = float(stats.mutations)
+        if left <= 0:
+          return m / l
+        # x mutants per line take perMutant * max(l*x - m, 0) seconds for
+        # this file and mean * x * remainingLines() for the rest.
+        others = mean * self.remainingLines()
+        if others > 0 and left / others <= m / l:
+          return left / others
+        return (left + perMutant * m) / (perMutant * l + others)
+
+    def start(self, stats):
+        """Start running mutants for stats' file."""
+        self.current = [stats, self.clock(), stats.mutations, None, None]
+
+    def enough(self, stats):
+        """True once the file started has had its share of the time."""
+        now = self.clock()
+        if now >= self.deadline:
+          return True
+        (stats, start, mutations, allotment, planned) = self.current
+        if planned is None or now - planned >= self.interval:
+          ran = stats.mutations - mutations
+          x = self.plan(stats, None if ran == 0 else (now - start) / ran)
+          if x is not None:
+            allotment = int(math.ceil(x * stats.lines))
+            debug("%.0f seconds left, aiming for delta %.3f" % (self.deadline - now, 1.0/math.sqrt(max(x, 1e-9))))
+          self.current[3:5] = [allotment, now]
+        return allotment is not None and stats.mutations >= allotment
+
+    def allot(self, stats, needed):
+        """
+        How many of the needed mutants stats' file gets, planned once, for
+        when they are all handed out at the start (as to workers).
+        """
+        x = self.plan(stats)
+        if x is None:
+          return needed
+        return min(needed, max(int(math.ceil(x * stats.lines)) - stats.mutations, 0))
@@ -0,0 +1,391 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Estimation spread over many machines. A coordinator splits the mutants
+each file needs into work units and hands them to workers over TCP. A
+unit names its file by digest; a worker asks for the file's source and
+baseline the first time it sees that digest, then makes and runs the
+mutants and sends back (mutLine, errorLine, exception, ...) outcomes,
+which the coordinator counts.
+
+Messages are length prefixed JSON. Workers send heartbeats while they
+work; a unit whose worker goes quiet or disconnects is handed out again.
+"""
+
+from logging import debug, info, warning, error
+from collections import deque, OrderedDict
+import socket, struct, json, threading, time
+from estimatecharm.charmCorpus import duplicateFile
+try:
+  import socketserver
+except ImportError:
+  import SocketServer as socketserver
+try:
+  from Queue import Queue, Empty
+except ImportError:
+  from queue import Queue, Empty
+
+def parseAddress(address):
+    """Turn "host:port" into a (host, port) tuple."""
+    (host, port) = address.rsplit(":", 1)
+    return (host, int(port))
+
+def sendMessage(sock, message):
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+def receiveExactly(sock, n):
+    chunks = []
+    while n > 0:
+      chunk = sock.recv(min(n, 65536))
+      if not chunk:
+        raise EOFError("Connection closed.")
+      chunks.append(chunk)
+      n = n - len(chunk)
+    return b"".join(chunks)
+
+def receiveMessage(sock):
+    (n,) = struct.unpack("!I", receiveExactly(sock, 4))
+    return json.loads(receiveExactly(sock, n).decode('utf-8'))
+
+class workQueue(object):
+    """Work units waiting for a worker, and those out with one."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.outstanding = dict()
+        self.results = Queue()
+        self.sources = dict()
+        self.nextId = 0
+        self.workers = 0
+        self.alone = time.time()
+        self.closed = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, unit):
+        with self.condition:
+          unit['id'] = self.nextId
+          self.nextId = self.nextId + 1
+          self.pending.append(unit)
+          self.condition.notify()
+
+    def share(self, digest, source, baseline):
+        """Keep a file's source and baseline for workers that ask for digest."""
+        with self.condition:
+          self.sources[digest] = dict(source=source, baseline=baseline)
+
+    def forget(self, digest):
+        with self.condition:
+          self.sources.pop(digest, None)
+
+    def source(self, digest):
+        """The source and baseline shared for digest, or None once it's forgotten."""
+        with self.condition:
+          return self.sources.get(digest)
+
+    def take(self, timeout):
+        """Hand out the next unit, or None if there isn't one in time."""
+        with self.condition:
+          if len(self.pending) == 0 and not self.closed:
+            self.condition.wait(timeout)
+          if len(self.pending) == 0:
+            return None
+          unit = self.pending.popleft()
+          self.outstanding[unit['id']] = unit
+          return unit
+
+    def finish(self, unitId, outcomes):
+        """Accept a unit's outcomes. Late duplicates of requeued units are dropped."""
+        with self.condition:
+          unit = self.outstanding.pop(unitId, None)
+        if unit is not None:
+          self.results.put((unit, outcomes))
+
+    def requeue(self, unitId):
+        with self.condition:
+          unit = self.outstanding.pop(unitId, None)
+          if unit is not None:
+            warning("Requeueing work unit %i for %s" % (unitId, unit['path']))
+            self.pending.appendleft(unit)
+            self.condition.notify()
+
+    def cancel(self, path):
+        """Drop pending units for path, returning how many there were."""
+        with self.condition:
+          keep = deque(unit for unit in self.pending if unit['path'] != path)
+          cancelled = len(self.pending) - len(keep)
+          self.pending = keep
+          return cancelled
+
+    def connected(self, change):
+        """Count workers coming and going, noting when the last one left."""
+        with self.condition:
+          self.workers = self.workers + change
+          if self.workers == 0:
+            self.alone = time.time()
+
+    def idle(self):
+        """Seconds since the last worker left, or 0 while there are any."""
+        with self.condition:
+          if self.workers > 0:
+            return 0.0
+          return time.time() - self.alone
+
+    def close(self):
+        with self.condition:
+          self.closed = True
+          self.condition.notify_all()
+
+class coordinatorHandler(socketserver.BaseRequestHandler):
+    """Talks to one worker for as long as it stays connected."""
+
+    def handle(self):
+        work = self.server.work
+        self.request.settimeout(self.server.heartbeatTimeout)
+        unit = None
+        work.connected(1)
+        info("Worker connected from %s:%i" % self.client_address[0:2])
+        try:
+          while True:
+            message = receiveMessage(self.request)
+            if message['type'] == 'heartbeat':
+              continue
+            elif message['type'] == 'source':
+              sendMessage(self.request, dict(type='source', digest=message['digest'],
+                                             file=work.source(message['digest'])))
+              continue
+            elif message['type'] == 'result':
+              work.finish(message['id'], message['outcomes'])
+              unit = None
+            unit = work.take(self.server.poll)
+            if unit is not None:
+              sendMessage(self.request, dict(unit, type='unit'))
+            elif work.closed:
+              sendMessage(self.request, dict(type='done'))
+              break
+            else:
+              sendMessage(self.request, dict(type='wait'))
+        except (socket.timeout, socket.error, EOFError, ValueError) as e:
+          warning("Lost worker %s:%i: %s" % (self.client_address[0], self.client_address[1], e))
+        finally:
+          work.connected(-1)
+          if unit is not None:
+            work.requeue(unit['id'])
+
+class coordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class charmCoordinator(object):
+    """
+    Runs estimation for an estimateCharm, but sends the mutants out to
+    workers in units of unitSize instead of running them itself. Once
+    there have been no workers for abandon seconds, with units left to
+    run, it gives up with a RuntimeError rather than wait forever.
+    """
+
+    def __init__(self, estimator, address=("127.0.0.1", 0), unitSize=16,
+                 heartbeatTimeout=30.0, poll=1.0, abandon=120.0):
+        self.estimator = estimator
+        self.address = address
+        self.unitSize = unitSize
+        self.work = workQueue()
+        self.heartbeatTimeout = heartbeatTimeout
+        self.poll = poll
+        self.abandon = abandon
+        self.server = None
+
+    def start(self):
+        self.server = coordinatorServer(self.address, coordinatorHandler)
+        self.server.work = self.work
+        self.server.heartbeatTimeout = self.heartbeatTimeout
+        self.server.poll = self.poll
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        info("Coordinating on %s:%i" % self.address[0:2])
+
+    def units(self, fi, stats, mutation, deltamax):
+        """Split the mutants fi still needs into work units."""
+        if stats.needed(deltamax) == 0:
+          return list()
+        needed = stats.needed(deltamax)
+        if self.estimator.budget is not None:
+          needed = self.estimator.budget.allot(stats, needed)
+        (make, lines) = self.estimator.mutants(fi, stats, mutation, deltamax, needed)
+        lines = list(lines)
+        units = list()
+        for start in range(0, len(lines), self.unitSize):
+          units.append(dict(
+            path=fi.path,
+            digest=fi.digest,
+            operator=make.__name__,
+            lines=lines[start:start+self.unitSize]
+            ))
+        return units
+
+    def estimate(self, mutation, deltamax):
+        """Like estimateCharm.estimate, keeping enough units queued to feed every worker."""
+        estimator = self.estimator
+        budget = estimator.budget
+        estimator.deltamax = deltamax
+        files = iter(estimator.corpus)
+        active = dict()
+        exhausted = False
+        while True:
+          while not exhausted and len(self.work) < max(2, 2 * self.work.workers):
+            if budget is not None and budget.expired():
+              exhausted = True
+              break
+            try:
+              fi = next(files)
+            except StopIteration:
+              exhausted = True
+              break
+            if budget is not None:
+              budget.reach(fi.path, getattr(fi, 'lines', None))
+            if isinstance(fi, duplicateFile):
+              estimator.copied(fi)
+              continue
+            stats = estimator.fileStats(fi)
+            units = self.units(fi, stats, mutation, deltamax)
+            if len(units) == 0:
+              estimator.finishFile(fi, stats)
+              continue
+            info("Testing " + fi.path)
+            active[fi.path] = [fi, stats, len(units)]
+            self.work.share(fi.digest, fi.original, fi.baseline)
+            for unit in units:
+              self.work.put(unit)
+          if len(active) == 0:
+            break
+          try:
+            (unit, outcomes) = self.work.results.get(True, self.poll)
+          except Empty:
+            if self.work.idle() > self.abandon:
+              files.close()
+              raise RuntimeError("No workers for %i seconds, with %i files unfinished."
+                                 % (self.abandon, len(active)))
+            continue
+          entry = active[unit['path']]
+          (fi, stats) = entry[0:2]
+          for outcome in outcomes:
+            if isinstance(outcome, str):
+              info(outcome)
+              entry[2] = entry[2] - self.work.cancel(fi.path)
+              break
+            estimator.record(stats, mutation, outcome, deltamax)
+          entry[2] = entry[2] - 1
+          if budget is not None and budget.expired():
+            # Only wait for the units workers already have.
+            exhausted = True
+            for other in active.values():
+              other[2] = other[2] - self.work.cancel(other[0].path)
+          for (fi, stats, left) in list(active.values()):
+            if left == 0:
+              estimator.finishFile(fi, stats)
+              del active[fi.path]
+              if not any(other[0].digest == fi.digest for other in active.values()):
+                self.work.forget(fi.digest)
+        files.close()
+        estimator.reportBudget()
+        estimator.reportFailures()
+        estimator.reportCopies()
+
+    def release(self):
+        self.work.close()
+        if self.server is not None:
+          self.server.shutdown()
+          self.server.server_close()
+          self.server = None
+
+class charmWorker(object):
+    """
+    Takes work units from a coordinator and runs them with estimator, an
+    estimateCharm with no input files of its own.
+    """
+
+    def __init__(self, address, estimator, heartbeat=5.0, keep=4):
+        self.address = address
+        self.estimator = estimator
+        self.heartbeat = heartbeat
+        self.keep = keep
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    def send(self, sock, message):
+        with self.lock:
+          sendMessage(sock, message)
+
+    def load(self, sock, unit):
+        """Get the charmFile for a unit, reusing the last few and asking the coordinator for others."""
+        fi = self.files.pop(unit['digest'], None)
+        if fi is None:
+          self.send(sock, dict(type='source', digest=unit['digest']))
+          shared = receiveMessage(sock)['file']
+          if shared is None:
+            return None
+          self.estimator.baselines.put(shared['baseline'])
+          fi = self.estimator.loadCharmFile(unit['path'], shared['source'])
+          if fi is None:
+            return None
+        self.files[unit['digest']] = fi
+        while len(self.files) > self.keep:
+          self.files.popitem(False)
+        return fi
+
+    def work(self, sock, unit):
+        fi = self.load(sock, unit)
+        if fi is None:
+          return ["Couldn't load %s on this worker" % (unit['path'])]
+        mutation = getattr(type(self.estimator), unit['operator'])
+        return list(self.estimator.outcomes(fi, mutation, unit['lines']))
+
+    def beat(self, sock, stop, unitId):
+        while not stop.wait(self.heartbeat):
+          self.send(sock, dict(type='heartbeat', id=unitId))
+
+    def run(self):
+        sock = socket.create_connection(self.address)
+        try:
+          self.send(sock, dict(type='ready'))
+          while True:
+            message = receiveMessage(sock)
+            if message['type'] == 'done':
+              break
+            elif message['type'] == 'wait':
+              self.send(sock, dict(type='ready'))
+              continue
+            stop = threading.Event()
+            beater = threading.Thread(target=self.beat, args=(sock, stop, message['id']))
+            beater.daemon = True
+            beater.start()
+            try:
+              outcomes = self.work(sock, message)
+            finally:
+              stop.set()
+              beater.join()
+            self.send(sock, dict(type='result', id=message['id'], outcomes=outcomes))
+        except EOFError:
+          info("Coordinator went away.")
+        finally:
+          sock.close()
@@ -0,0 +1,203 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Streaming input corpora: paths come in lazily, charmFiles get built late."""
+
+from logging import debug, info, warning, error
+from collections import deque
+from itertools import chain
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+import os, sys
+import fnmatch
+import json
+
+def walkCorpus(root, globs=("*.py",)):
+    """Yield every file under root matching any of globs, in a stable order."""
+    for dirPath, dirNames, fileNames in os.walk(root):
+      dirNames.sort()
+      for fileName in sorted(fileNames):
+        for pattern in globs:
+          if fnmatch.fnmatch(fileName, pattern):
+            yield os.path.join(dirPath, fileName)
+            break
+
+def readPathList(f):
+    """Yield newline-delimited paths from an open file, skipping blank lines."""
+    for line in f:
+      line = line.strip()
+      if len(line) > 0:
+        yield line
+
+def corpusPaths(sources, globs=("*.py",)):
+    """
+    Expand input arguments into file paths, lazily. A directory is walked
+    for files matching globs, "-" reads newline-delimited paths from stdin
+    and "@list" reads them from the file named list.
+    """
+    for source in sources:
+      if source == "-":
+        for path in readPathList(sys.stdin):
+          yield path
+      elif source.startswith("@"):
+        with open(source[1:]) as f:
+          for path in readPathList(f):
+            yield path
+      elif os.path.isdir(source):
+        for path in walkCorpus(source, globs):
+          yield path
+      else:
+        yield source
+
+def residentMemory():
+    """Resident set size of this process in bytes, or its peak if unknown."""
+    try:
+      with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+      import resource
+      return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def baselineKey(entry):
+    """
+    What a baseline result depends on: a hash of the file's contents, its
+    path, which relative imports and __file__ see, and the virtualenv it
+    was run in, which decides sys.path.
+    """
+    return (entry['digest'], entry['path'], entry.get('activate', None))
+
+class baselineCache(object):
+    """
+    Results of running unmutated files, keyed by baselineKey(). If given a
+    path, entries are appended to it as JSON lines and read back by later
+    runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = dict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+          with open(path) as f:
+            for line in f:
+              if len(line.strip()) > 0:
+                entry = json.loads(line)
+                self.entries[baselineKey(entry)] = entry
+
+    def get(self, digest, path, activate=None):
+        with self.lock:
+          entry = self.entries.get((digest, path, activate), None)
+          if entry is None:
+            self.misses = self.misses + 1
+          else:
+            self.hits = self.hits + 1
+          return entry
+
+    def put(self, entry):
+        with self.lock:
+          self.entries[baselineKey(entry)] = entry
+          if self.path is not None:
+            with open(self.path, 'a') as f:
+              f.write(json.dumps(entry) + "\n")
+
+class duplicateFile(object):
+    """
+    Stands in for an input with the same contents as first, an input
+    loaded before it, so it gets first's results instead of its own.
+    """
+
+    def __init__(self, path, digest, first):
+        self.path = path
+        self.digest = digest
+        self.first = first
+
+    def shed(self):
+        pass
+
+def skipped(pending):
+    """Whether a load on the pool has finished, and came to nothing."""
+    return pending.ready() and pending.successful() and pending.get() is None
+
+class charmCorpus(object):
+    """
+    Input files, loaded on demand. At most window loaded files are held
+    ahead of the one being estimated, so memory use doesn't grow with the
+    size of the corpus and estimation starts as soon as the first file is
+    ready. Loading (which includes the baseline run) happens on up to
+    concurrency threads at once. If memoryLimit (bytes) is given, nothing
+    more is loaded ahead while resident memory is above it.
+    """
+
+    def __init__(self, load, window=1, concurrency=1, memoryLimit=None):
+        self.load = load
+        self.window = window
+        self.concurrency = concurrency
+        self.memoryLimit = memoryLimit
+        self.sources = list()
+
+    def full(self, pending):
+        if len(pending) >= max(self.window, self.concurrency):
+          return True
+        if self.memoryLimit is not None and len(pending) > 0:
+          if residentMemory() > self.memoryLimit:
+            debug("Over the memory limit, not loading more files ahead.")
+            return True
+        return False
+
+    def add(self, paths):
+        """Queue an iterable of paths. Nothing is read until iteration."""
+        self.sources.append(paths)
+
+    def __iter__(self):
+        paths = chain.from_iterable(self.sources)
+        self.sources = list()
+        if self.concurrency > 1:
+          pool = ThreadPool(self.concurrency)
+        else:
+          pool = None
+        pending = deque()
+        exhausted = False
+        try:
+          while True:
+            # Files that came to nothing don't hold a place in the window.
+            if pool is not None:
+              pending = deque(p for p in pending if not skipped(p))
+            while not exhausted and not self.full(pending):
+              try:
+                path = next(paths)
+              except StopIteration:
+                exhausted = True
+                break
+              if pool is None:
+                loaded = self.load(path)
+                if loaded is not None:
+                  pending.append(loaded)
+              else:
+                pending.append(pool.apply_async(self.load, (path,)))
+            if len(pending) == 0:
+              return
+            loaded = pending.popleft()
+            if pool is not None:
+              loaded = loaded.get()
+            if loaded is not None:
+              yield loaded
+        finally:
+          if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,132 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Which lines of a file its unmutated run reaches, and which mutants can't
+change that. A mutant confined to one line that never ran, inside a
+function rather than module or class level code, can only end the way the
+unmutated file did, as long as it compiles and every function that did run
+keeps its variables and flags: otherwise an edit on a line that never ran
+can still make a name local, or a function a generator, where it ran.
+"""
+
+import sys, threading, warnings
+from dis import findlinestarts
+from inspect import CO_NEWLOCALS
+
+from estimatecharm.mutantChild import applyEdit
+
+class lineTracer(object):
+    """Collects the lines of path that run between start() and stop()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.executed = set()
+
+    def call(self, frame, event, arg):
+        if frame.f_code.co_filename != self.path:
+          return None
+        return self.line
+
+    def line(self, frame, event, arg):
+        if event == 'line':
+          self.executed.add(frame.f_lineno)
+        return self.line
+
+    def start(self):
+        threading.settrace(self.call)
+        sys.settrace(self.call)
+
+    def stop(self):
+        sys.settrace(None)
+        threading.settrace(None)
+        return sorted(self.executed)
+
+def codeLines(code, functionLines, otherLines):
+    """
+    Sort the lines code has instructions on into those in function bodies
+    and those run as the module or a class body is defined.
+    """
+    if code.co_flags & CO_NEWLOCALS:
+      lines = functionLines
+    else:
+      lines = otherLines
+    for (offset, line) in findlinestarts(code):
+      if line is not None:
+        lines.add(line)
+    for const in code.co_consts:
+      if hasattr(const, 'co_code'):
+        codeLines(const, functionLines, otherLines)
+    return (functionLines, otherLines)
+
+def codeSignatures(code, executed=None, signatures=None, key=()):
+    """
+    The variables and flags of code and the code objects nested in it, by
+    their names and first lines, leaving out functions none of whose body
+    is in executed, if given. A function's first line runs as it's defined,
+    so it doesn't count.
+    """
+    if signatures is None:
+      signatures = dict()
+    key = key + ((code.co_name, code.co_firstlineno),)
+    lines = set(line for (offset, line) in findlinestarts(code) if line is not None)
+    if code.co_flags & CO_NEWLOCALS:
+      lines.discard(code.co_firstlineno)
+    if executed is None or not code.co_flags & CO_NEWLOCALS or len(lines & executed) > 0:
+      signatures[key] = (code.co_varnames, code.co_cellvars, code.co_freevars, code.co_flags)
+    for const in code.co_consts:
+      if hasattr(const, 'co_code'):
+        codeSignatures(const, executed, signatures, key)
+    return signatures
+
+def baseSignatures(base, path, executed):
+    """codeSignatures() of what ran of base, for unreached(), or None if it doesn't compile."""
+    try:
+      with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return codeSignatures(compile(base, path, 'exec'), executed)
+    except (SyntaxError, ValueError, TypeError):
+      return None
+
+def unreached(base, path, executed, edit, ran=None):
+    """
+    True if the mutant made by edit (offset, deleted, inserted) of base,
+    whose run reached the lines in executed, can be classified as not
+    failing without running it. ran is baseSignatures() of base, if it's
+    been worked out already.
+    """
+    (offset, deleted, inserted) = edit
+    if "\n" in inserted or "\n" in base[offset:offset+deleted]:
+      return False
+    line = base.count("\n", 0, offset) + 1
+    if line in executed:
+      return False
+    try:
+      with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        code = compile(applyEdit(base, edit), path, 'exec')
+    except (SyntaxError, ValueError, TypeError):
+      return False
+    (functionLines, otherLines) = codeLines(code, set(), set())
+    if line not in functionLines or line in otherLines:
+      return False
+    if ran is None:
+      ran = baseSignatures(base, path, executed)
+    if ran is None:
+      return False
+    signatures = codeSignatures(code)
+    return all(signatures.get(key, None) == signature for (key, signature) in ran.items())
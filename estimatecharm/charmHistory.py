@@ -0,0 +1,188 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Per-line results of earlier runs, for estimating incrementally. Files
+that haven't changed since are not loaded again, and the counts for lines
+outside the changed regions of those that have are carried over through a
+line diff, so new mutants are only needed where the code changed.
+"""
+
+from logging import debug, info, warning, error
+from difflib import SequenceMatcher
+from threading import Lock
+import os, json, hashlib
+
+from estimatecharm.charmStats import charmStats
+
+def lineHashes(source):
+    """A short hash of each line of source, to diff without keeping the text."""
+    return [hashlib.sha1(line.encode('utf-8')).hexdigest()[:16]
+            for line in source.splitlines()]
+
+class unchangedFile(object):
+    """Stands in for a charmFile whose contents and results are as last time."""
+
+    def __init__(self, path, digest, stats):
+        self.path = path
+        self.digest = digest
+        self.lines = stats.lines
+        self.stats = stats
+
+    def shed(self):
+        pass
+
+class charmHistory(object):
+    """
+    The last results for each input path: its digest, line hashes and the
+    per-line mutant and error counts, with errors also counted by the line
+    of the mutant behind them. Entries are appended to path as JSON lines,
+    the last entry for an input path winning when read back, and a file
+    holding entries that lost is rewritten with only the winners. They
+    are found by digest too, so contents estimated under one path aren't
+    estimated again under another.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = dict()
+        self.digests = dict()
+        self.lock = Lock()
+        self.unchanged = 0
+        self.changed = 0
+        read = 0
+        if os.path.exists(path):
+          with open(path) as f:
+            for line in f:
+              if len(line.strip()) > 0:
+                entry = json.loads(line)
+                self.entries[entry['path']] = entry
+                read = read + 1
+        for entry in self.entries.values():
+          self.digests[entry['digest']] = entry
+        if read > len(self.entries):
+          self.compact()
+
+    def compact(self):
+        """Rewrite the file with just the last entry for each path."""
+        debug("Compacting %s to %i entries" % (self.path, len(self.entries)))
+        temporary = self.path + ".new"
+        with open(temporary, 'w') as f:
+          for entry in self.entries.values():
+            f.write(json.dumps(entry) + "\n")
+        os.rename(temporary, self.path)
+
+    def put(self, entry):
+        with self.lock:
+          self.entries[entry['path']] = entry
+          self.digests[entry['digest']] = entry
+          with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def stats(self, entry, path=None):
+        stats = charmStats(entry['path'] if path is None else path, entry['lines'])
+        for li in range(0, entry['lines']+2):
+          stats.progress[li] = entry['progress'][li]
+          stats.errors[li] = entry['errors'][li]
+        stats.recount()
+        return stats
+
+    def skip(self, path, source, deltamax):
+        """
+        An unchangedFile for path if it has the contents it, or another path,
+        had last time and those results were already within deltamax, else
+        None.
+        """
+        if deltamax is None:
+          return None
+        digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        with self.lock:
+          entry = self.entries.get(path, None)
+          if entry is None or entry['digest'] != digest:
+            entry = self.digests.get(digest, None)
+        if entry is None:
+          return None
+        stats = self.stats(entry, path)
+        if stats.needed(deltamax) > 0:
+          return None
+        if entry['path'] != path:
+          self.put(dict(entry, path=path))
+        with self.lock:
+          self.unchanged = self.unchanged + 1
+        return unchangedFile(path, digest, stats)
+
+    def carry(self, fi):
+        """
+        charmStats for fi with the counts of lines that match lines of its
+        last version, or None if it wasn't estimated before.
+        """
+        with self.lock:
+          entry = self.entries.get(fi.path, None)
+        if entry is None:
+          return None
+        stats = charmStats(fi.path, fi.lines)
+        old = entry['lines']
+        if entry['digest'] == fi.digest:
+          pairs = [(li, li) for li in range(1, min(old, fi.lines)+1)]
+        else:
+          matcher = SequenceMatcher(None, entry['hashes'], lineHashes(fi.original))
+          pairs = [(a + k + 1, b + k + 1)
+                   for (a, b, n) in matcher.get_matching_blocks()
+                   for k in range(0, n)
+                   if a + k < old and b + k < fi.lines]
+        moved = dict(pairs)
+        for (a, b) in pairs:
+          stats.progress[b] = entry['progress'][a]
+        kept = sum(stats.progress)
+        mutations = sum(entry['progress'])
+        if 'lineErrors' in entry:
+          # Only errors of the mutants kept are kept. Those reported on a
+          # line that's gone can't be placed on a line any more.
+          stats.lineErrors = dict()
+          for (mutLine, errorLine, count) in entry['lineErrors']:
+            if mutLine not in moved:
+              continue
+            key = (moved[mutLine], moved.get(errorLine, fi.lines+1))
+            stats.errors[key[1]] = stats.errors[key[1]] + count
+            stats.lineErrors[key] = stats.lineErrors.get(key, 0) + count
+        elif mutations > 0:
+          # Without them, errors shrink with the mutants kept.
+          for (a, b) in pairs:
+            stats.errors[b] = int(round(entry['errors'][a] * kept / float(mutations)))
+          stats.errors[fi.lines+1] = int(round(entry['errors'][old+1] * kept / float(mutations)))
+        stats.recount()
+        debug("Carried %i of %i mutants of %s over" % (kept, mutations, fi.path))
+        with self.lock:
+          self.changed = self.changed + 1
+        return stats
+
+    def record(self, fi, stats):
+        """Remember a finished file's results."""
+        if isinstance(fi, unchangedFile):
+          return
+        entry = dict(
+          path=fi.path,
+          digest=fi.digest,
+          lines=stats.lines,
+          hashes=lineHashes(fi.original),
+          progress=list(stats.progress),
+          errors=list(stats.errors)
+          )
+        if stats.lineErrors is not None:
+          entry['lineErrors'] = [[mutLine, errorLine, count]
+                                 for ((mutLine, errorLine), count) in sorted(stats.lineErrors.items())]
+        self.put(entry)
@@ -0,0 +1,101 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Making mutants ahead of running them. Making one (copying and editing the
+token stream) can take longer than running it for long files, so mutants
+can be made by processes forked for each file, in parallel with running
+them and with each other. Unlike a thread, they
+don't share the GIL, or a process the executor forks from.
+"""
+
+from logging import debug, info, warning, error
+import multiprocessing
+import random
+from random import randint
+
+try:
+  forked = multiprocessing.get_context("fork")
+except (AttributeError, ValueError):
+  forked = multiprocessing
+
+def make(estimator, fi, mutation, line):
+    """
+    Make fi's mutant for line, returning ("edit", (edit, location)),
+    ("inferred", location) if it needn't be run or ("error", why) if it
+    can't be made.
+    """
+    merror = mutation(estimator, fi, line)
+    if merror is not None:
+      return ("error", merror)
+    (edit, location) = fi.takeEdit()
+    if estimator.inferUnreached and fi.unreached(edit):
+      return ("inferred", location)
+    return ("edit", (edit, location))
+
+def maker(conn, estimator, fi, mutation, seed):
+    """Make the mutant for each line sent, until None is."""
+    random.seed(seed)
+    while True:
+      line = conn.recv()
+      if line is None:
+        break
+      conn.send(make(estimator, fi, mutation, line))
+
+def madeElsewhere(estimator, fi, mutation, lines, makers, ahead):
+    """
+    What make() comes to for each of lines, in order, from makers processes
+    forked for fi, kept up to ahead lines in front of what's been taken.
+    Lines go to them round robin and each is seeded from random, so a run
+    with the same seed makes the same mutants.
+    """
+    conns = list()
+    processes = list()
+    try:
+      for i in range(0, makers):
+        (here, there) = forked.Pipe()
+        p = forked.Process(target=maker, args=(there, estimator, fi, mutation, randint(0, 2**31)))
+        p.daemon = True
+        p.start()
+        there.close()
+        conns.append(here)
+        processes.append(p)
+      lines = iter(lines)
+      sent = 0
+      received = 0
+      exhausted = False
+      while True:
+        while not exhausted and sent - received < max(ahead, makers):
+          try:
+            line = next(lines)
+          except StopIteration:
+            exhausted = True
+            break
+          conns[sent % makers].send(line)
+          sent = sent + 1
+        if received == sent:
+          return
+        made = conns[received % makers].recv()
+        received = received + 1
+        yield made
+    finally:
+      for p in processes:
+        p.terminate()
+      for p in processes:
+        p.join()
+      for conn in conns:
+        conn.close()
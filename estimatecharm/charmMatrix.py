@@ -0,0 +1,134 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Which lines blame which: counts of (mutated line, error line, exception)
+for every file, kept sparse and written as a NumPy .npz of COO columns
+without needing NumPy to write or read it.
+"""
+
+from logging import debug, info, warning, error
+from array import array
+import sys, ast, struct, zipfile
+
+byteOrder = '<' if sys.byteorder == 'little' else '>'
+
+def npyHeader(descr, length):
+    """An NPY 1.0 header for a one dimensional array."""
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%i,), }" % (descr, length)
+    # Magic, version and length take 10 bytes; the data starts 64 aligned.
+    header = header + " " * (63 - (10 + len(header)) % 64) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode('latin1')
+
+def npyArray(values):
+    """An array.array of integers, or a list of strings, as an .npy file."""
+    if isinstance(values, array):
+      descr = "%si%i" % (byteOrder, values.itemsize)
+      return npyHeader(descr, len(values)) + values.tobytes()
+    width = max([1] + [len(value) for value in values])
+    data = b"".join(value.ljust(width, "\0").encode('utf-32-le') for value in values)
+    return npyHeader("<U%i" % (width), len(values)) + data
+
+def writeNpz(path, arrays):
+    """Write a dict of name: array.array or list of strings as a .npz."""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+      for (name, values) in arrays.items():
+        z.writestr(name + ".npy", npyArray(values))
+
+def readNpz(path):
+    """Read back what writeNpz wrote, as arrays and lists of strings."""
+    arrays = dict()
+    with zipfile.ZipFile(path) as z:
+      for name in z.namelist():
+        data = z.read(name)
+        start = 10 + struct.unpack("<H", data[8:10])[0]
+        header = ast.literal_eval(data[10:start].decode('latin1'))
+        (order, kind, width) = (header['descr'][0], header['descr'][1], int(header['descr'][2:]))
+        if kind == 'U':
+          text = data[start:].decode('utf-32-le')
+          values = [text[i:i+width].rstrip("\0") for i in range(0, len(text), width)]
+        else:
+          values = array([t for t in 'bhilq' if array(t).itemsize == width][0])
+          values.frombytes(data[start:])
+          if order != byteOrder:
+            values.byteswap()
+        arrays[name[:-len(".npy")]] = values
+    return arrays
+
+class charmMatrix(object):
+    """
+    Mutant counts by (file, mutated line, error line, exception) for the
+    files estimated so far, as compact columns. Files are added as they
+    finish, from the pairs their charmStats counted. A file that was a
+    copy of another shares the other's cells, as sameAs says.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = list()
+        self.indices = dict()
+        self.lines = array('l')
+        self.sameAs = array('l')
+        self.exceptions = dict()
+        self.columns = dict((name, array('l'))
+                            for name in ("file", "mutLine", "errorLine", "exception", "count"))
+
+    def exceptionIndex(self, name):
+        if name not in self.exceptions:
+          self.exceptions[name] = len(self.exceptions)
+        return self.exceptions[name]
+
+    def add(self, stats):
+        """Take a finished file's counts, leaving its charmStats without them."""
+        index = len(self.files)
+        self.indices[stats.path] = index
+        self.files.append(stats.path)
+        self.lines.append(stats.lines)
+        self.sameAs.append(index)
+        cells = sorted((mutLine, errorLine, self.exceptionIndex(exception), count)
+                       for ((mutLine, errorLine, exception), count) in stats.pairs.items())
+        stats.pairs = dict()
+        for (mutLine, errorLine, exception, count) in cells:
+          self.columns["file"].append(index)
+          self.columns["mutLine"].append(mutLine)
+          self.columns["errorLine"].append(errorLine)
+          self.columns["exception"].append(exception)
+          self.columns["count"].append(count)
+
+    def alias(self, path, first):
+        """Add path as a copy of first, an earlier file."""
+        index = self.indices[first]
+        self.indices[path] = len(self.files)
+        self.files.append(path)
+        self.lines.append(self.lines[index])
+        self.sameAs.append(index)
+
+    def write(self):
+        """
+        Write the matrix: files, lines (rows and columns are numbered 0 to
+        lines+1 per file) and exceptions name what the file and exception
+        columns index, and each cell is a file, mutLine, errorLine,
+        exception and count, sorted. A file's cells are those of
+        sameAs[file].
+        """
+        arrays = dict(self.columns)
+        arrays["files"] = self.files
+        arrays["lines"] = self.lines
+        arrays["sameAs"] = self.sameAs
+        arrays["exceptions"] = sorted(self.exceptions, key=self.exceptions.get)
+        writeNpz(self.path, arrays)
+        info("Wrote %i cells for %i files to %s" % (len(self.columns["count"]), len(self.files), self.path))
@@ -0,0 +1,171 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Progress of a long estimation run in the Prometheus text format, either
+rewritten to a file every so often or served over HTTP on localhost.
+"""
+
+from logging import debug, info, warning, error
+import os, time, threading
+try:
+  from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+  from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+def escapeLabel(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class charmMetrics(object):
+    """Counts kept by an estimateCharm as it goes."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.lock = threading.Lock()
+        self.startTime = time.time()
+        self.mutants = 0
+        self.inferred = 0
+        self.halted = 0
+        self.limited = 0
+        self.inFlight = 0
+        self.filesDone = 0
+        self.deltamax = None
+        self.files = dict()
+        self.thread = None
+        self.server = None
+        self.stopping = threading.Event()
+
+    def sent(self):
+        with self.lock:
+          self.inFlight = self.inFlight + 1
+
+    def received(self, count=1):
+        """Count mutants back from the executor, or given up on."""
+        with self.lock:
+          self.inFlight = self.inFlight - count
+
+    def recorded(self, stats, outcome, deltamax):
+        """Count one mutant's outcome, after stats has been updated."""
+        with self.lock:
+          self.mutants = self.mutants + 1
+          if outcome[7]:
+            self.inferred = self.inferred + 1
+          if outcome[2] == "HaltingError":
+            self.halted = self.halted + 1
+          elif outcome[2] == "ResourceLimitError":
+            self.limited = self.limited + 1
+          self.deltamax = deltamax
+          self.files[stats.path] = (stats.delta, stats.needed(deltamax))
+
+    def finished(self, path):
+        with self.lock:
+          self.files.pop(path, None)
+          self.filesDone = self.filesDone + 1
+
+    def render(self):
+        """The current metrics as Prometheus text exposition."""
+        with self.lock:
+          elapsed = max(time.time() - self.startTime, 1e-9)
+          rate = self.mutants / elapsed
+          remaining = sum(needed for (delta, needed) in self.files.values())
+          files = sorted(self.files.items())
+          lines = [
+            ("mutants_total", "counter", "Mutants counted so far", self.mutants),
+            ("mutants_inferred_total", "counter", "Mutants classified without running", self.inferred),
+            ("mutants_halting_total", "counter", "Mutants that didn't halt", self.halted),
+            ("mutants_resource_limited_total", "counter", "Mutants that hit a resource limit", self.limited),
+            ("mutants_per_second", "gauge", "Mutants counted per second since the start", rate),
+            ("in_flight", "gauge", "Mutants handed to the executor and not back yet", self.inFlight),
+            ("files_done_total", "counter", "Input files finished", self.filesDone),
+            ("eta_seconds", "gauge", "Time left for the files being estimated at the current rate",
+             remaining / rate if rate > 0 else float("inf")),
+            ]
+        baselines = self.estimator.baselines
+        lines.extend([
+          ("baseline_cache_hits_total", "counter", "Input files whose baseline came from the cache", baselines.hits),
+          ("baseline_cache_misses_total", "counter", "Input files that had to be run unmutated", baselines.misses),
+          ("baseline_failures_total", "counter", "Input files that failed baseline validation", len(self.estimator.failures)),
+          ("executor_failures_total", "counter", "Times the executor itself failed and was restarted",
+           getattr(self.estimator.executor, 'failures', 0)),
+          ])
+        out = list()
+        for (name, kind, doc, value) in lines:
+          out.append("# HELP estimatecharm_%s %s" % (name, doc))
+          out.append("# TYPE estimatecharm_%s %s" % (name, kind))
+          out.append("estimatecharm_%s %s" % (name, repr(float(value))))
+        if self.deltamax is not None:
+          out.append("# HELP estimatecharm_deltamax Maximum error asked for")
+          out.append("# TYPE estimatecharm_deltamax gauge")
+          out.append("estimatecharm_deltamax %r" % (float(self.deltamax)))
+        for (name, index, doc) in [("file_delta", 0, "Current error of a file being estimated"),
+                                   ("file_needed", 1, "Mutants a file still needs to reach deltamax")]:
+          out.append("# HELP estimatecharm_%s %s" % (name, doc))
+          out.append("# TYPE estimatecharm_%s gauge" % (name))
+          for (path, values) in files:
+            out.append("estimatecharm_%s{file=\"%s\"} %r" % (name, escapeLabel(path), float(values[index])))
+        return "\n".join(out) + "\n"
+
+    def write(self, path):
+        """Replace the file at path with the current metrics."""
+        temp = path + ".tmp"
+        with open(temp, 'w') as f:
+          f.write(self.render())
+        os.rename(temp, path)
+
+    def writeEvery(self, path, interval):
+        while not self.stopping.wait(interval):
+          try:
+            self.write(path)
+          except (IOError, OSError) as e:
+            warning("Couldn't write metrics to %s: %s" % (path, e))
+        self.write(path)
+
+    def serve(self, path=None, port=None, interval=10.0):
+        """Start rewriting path every interval seconds and/or serving on localhost:port."""
+        if path is not None:
+          self.thread = threading.Thread(target=self.writeEvery, args=(path, interval))
+          self.thread.daemon = True
+          self.thread.start()
+        if port is not None:
+          self.server = HTTPServer(("127.0.0.1", port), metricsHandler)
+          self.server.metrics = self
+          server = threading.Thread(target=self.server.serve_forever)
+          server.daemon = True
+          server.start()
+          info("Serving metrics on http://127.0.0.1:%i/metrics" % (self.server.server_address[1]))
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+          self.thread.join()
+          self.thread = None
+        if self.server is not None:
+          self.server.shutdown()
+          self.server.server_close()
+          self.server = None
+
+class metricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        debug(format % args)
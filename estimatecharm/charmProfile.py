@@ -0,0 +1,138 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Memory profiling with tracemalloc. Live allocations are charged to the
+innermost estimatecharm function on their traceback, so lexemes, copied
+token lists and per-line stats show up under the code that made them
+rather than under list or tuple internals.
+"""
+
+from logging import debug, info, warning, error
+import os, ast, time
+import tracemalloc
+
+packageDir = os.path.dirname(os.path.abspath(__file__))
+
+class functionIndex(object):
+    """Finds the function a line of a source file is in."""
+
+    def __init__(self):
+        self.files = dict()
+
+    def ranges(self, filename):
+        if filename not in self.files:
+          ranges = list()
+          try:
+            with open(filename) as f:
+              tree = ast.parse(f.read(), filename)
+            for node in ast.walk(tree):
+              if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                ranges.append((node.lineno, getattr(node, 'end_lineno', node.lineno), node.name))
+          except (IOError, OSError, SyntaxError, ValueError):
+            pass
+          # Innermost first: of two ranges holding a line, the later start wins.
+          ranges.sort(reverse=True)
+          self.files[filename] = ranges
+        return self.files[filename]
+
+    def function(self, filename, line):
+        for (start, end, name) in self.ranges(filename):
+          if start <= line <= end:
+            return name
+        return "<module>"
+
+class memoryProfiler(object):
+    """
+    Snapshots live allocations at the points estimation reports to it and
+    appends the top sites, and the biggest growth since the last snapshot,
+    to the report file at path.
+    """
+
+    def __init__(self, path, every=1000, top=15, frames=16):
+        self.path = path
+        self.every = every
+        self.top = top
+        self.frames = frames
+        self.mutants = 0
+        self.index = functionIndex()
+        self.previous = None
+        self.startTime = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+          tracemalloc.start(self.frames)
+        self.startTime = time.time()
+        with open(self.path, 'w') as f:
+          f.write("Memory profile, %i frames per allocation\n" % (self.frames))
+
+    def site(self, traceback):
+        """(module, function) of the innermost estimatecharm frame in traceback."""
+        for frame in reversed(traceback):
+          filename = os.path.abspath(frame.filename)
+          if os.path.dirname(filename) == packageDir:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            return (module, self.index.function(filename, frame.lineno))
+        return ("<other>", "<other>")
+
+    def sites(self, snapshot):
+        sizes = dict()
+        for stat in snapshot.statistics('traceback'):
+          site = self.site(stat.traceback)
+          (size, count) = sizes.get(site, (0, 0))
+          sizes[site] = (size + stat.size, count + stat.count)
+        return sizes
+
+    def snapshot(self, label):
+        """Record live allocations now, labelled with what just happened."""
+        if self.startTime is None:
+          return
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+          tracemalloc.Filter(False, tracemalloc.__file__),
+          tracemalloc.Filter(False, __file__),
+          ])
+        sizes = self.sites(snapshot)
+        (current, peak) = tracemalloc.get_traced_memory()
+        report = ["", "== %s at %.1fs: %.1f KiB traced, %.1f KiB peak" % (
+          label, time.time() - self.startTime, current / 1024.0, peak / 1024.0)]
+        ranked = sorted(sizes.items(), key=lambda item: -item[1][0])
+        for ((module, function), (size, count)) in ranked[:self.top]:
+          report.append("  %10.1f KiB %8i blocks  %s.%s" % (size / 1024.0, count, module, function))
+        if self.previous is not None:
+          growth = list()
+          for (site, (size, count)) in sizes.items():
+            grown = size - self.previous.get(site, (0, 0))[0]
+            if grown > 0:
+              growth.append((grown, site))
+          growth.sort(reverse=True)
+          for (grown, (module, function)) in growth[:self.top]:
+            report.append("  GROWTH %+10.1f KiB  %s.%s" % (grown / 1024.0, module, function))
+        self.previous = sizes
+        with open(self.path, 'a') as f:
+          f.write("\n".join(report) + "\n")
+
+    def mutant(self):
+        """Count a mutant, snapshotting every so many."""
+        self.mutants = self.mutants + 1
+        if self.mutants % self.every == 0:
+          self.snapshot("%i mutants" % (self.mutants))
+
+    def stop(self):
+        if self.startTime is not None:
+          self.snapshot("end")
+          tracemalloc.stop()
+          self.startTime = None
@@ -0,0 +1,119 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The space of every mutant an operator can make on each line of a file, for
+sampling mutants without replacement. Each line gets mutants in turn, as
+the operators are given lines round robin, and within a line each of its
+mutants comes once before any comes again.
+"""
+
+from logging import debug, info, warning, error
+from collections import deque
+from itertools import islice
+from random import randint
+
+def shuffled(r):
+    """The numbers in range r in random order, drawn lazily without replacement."""
+    swapped = dict()
+    n = len(r)
+    for i in range(0, n):
+      j = randint(i, n-1)
+      vj = swapped.get(j, j)
+      vi = swapped.pop(i, i)
+      if j != i:
+        swapped[j] = vi
+      yield r[vj]
+
+class mutantSpace(object):
+    """
+    The mutants an operator can make of a file: every position it can
+    make one at, on lines, times every choice of what to make it with.
+    Mutant i is (positions[i // len(choices)], choices[i % len(choices)]),
+    so the mutants on each line are numbered consecutively.
+    """
+
+    def __init__(self, positions, lines, choices):
+        self.positions = positions
+        self.lines = lines
+        self.choices = choices
+        self.size = len(positions) * len(choices)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        (position, choice) = divmod(i, len(self.choices))
+        return (self.positions[position], self.choices[choice])
+
+    def lineRanges(self):
+        """The line and range of mutant numbers of each line with mutants."""
+        width = len(self.choices)
+        start = 0
+        for i in range(1, len(self.positions)+1):
+          if i == len(self.positions) or self.lines[i] != self.lines[start]:
+            yield (self.lines[start], range(start * width, i * width))
+            start = i
+
+    def sample(self, count):
+        """
+        count mutant numbers, round robin over the lines, each line's drawn
+        without replacement until they run out and then drawn again.
+        """
+        return islice(self.roundRobin(), count)
+
+    def roundRobin(self):
+        lines = deque((r, shuffled(r)) for (line, r) in self.lineRanges())
+        while len(lines) > 0:
+          (r, numbers) = lines.popleft()
+          for i in numbers:
+            yield i
+            break
+          else:
+            numbers = shuffled(r)
+            yield next(numbers)
+          lines.append((r, numbers))
+
+def tokenSpace(scrubbed, replace=False):
+    """
+    Deleting any token but the ENDMARKER or, if replace, replacing it with
+    any token but the ENDMARKER. Replacements are every token of the file,
+    not every distinct one, as replaceRandom draws them.
+    """
+    positions = [i for i in range(0, len(scrubbed)) if scrubbed[i].type != 'ENDMARKER']
+    lines = [scrubbed[i].start.line for i in positions]
+    choices = [None]
+    if replace:
+      choices = [scrubbed[i] for i in positions]
+    return mutantSpace(positions, lines, choices)
+
+def charSpace(s, pattern):
+    """
+    Deleting any character of s but the first that pattern matches, on the
+    line the character deleting operators say it's on.
+    """
+    positions = list()
+    lines = list()
+    offset = 0
+    for (l, text) in enumerate(s.splitlines(True)):
+      for c in range(0, len(text)):
+        if offset + c > 0 and pattern.match(text[c]):
+          positions.append(offset + c)
+          # Those count the lines of what's before the character.
+          lines.append(l + 1 if c > 0 else l)
+      offset = offset + len(text)
+    return mutantSpace(positions, lines, [None])
@@ -0,0 +1,100 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Per-line charm statistics for one file, kept in compact arrays."""
+
+from array import array
+from copy import copy
+import math
+
+class charmStats(object):
+    """
+    Mutant and error counts and charm for every line of a file. Index 0 is
+    unused since line numbers start with 1, and index lines+1 collects
+    errors that couldn't be placed on a line. If pairs is on, mutants are
+    also counted by (mutated line, error line, exception) in a dict, and if
+    lineErrors is, by (mutated line, error line) in another, which lasts.
+    """
+
+    def __init__(self, path, lines, pairs=False, lineErrors=False):
+        self.path = path
+        self.lines = lines
+        self.progress = array('l', [0]) * (lines+2)
+        self.errors = array('l', [0]) * (lines+2)
+        self.charm = array('d', [0.0]) * (lines+2)
+        self.mutations = 0
+        self.delta = float("inf")
+        self.pairs = dict() if pairs else None
+        self.lineErrors = dict() if lineErrors else None
+
+    def record(self, mutLine, errorLine, exception=None):
+        """Count one mutant on mutLine that was reported on errorLine."""
+        l = self.lines
+        if self.pairs is not None:
+          key = (mutLine, errorLine, exception)
+          self.pairs[key] = self.pairs.get(key, 0) + 1
+        if self.lineErrors is not None:
+          key = (mutLine, errorLine)
+          self.lineErrors[key] = self.lineErrors.get(key, 0) + 1
+        self.errors[errorLine] = self.errors[errorLine] + 1
+        self.progress[mutLine] = self.progress[mutLine] + 1
+        self.mutations = self.mutations + 1
+        assert(l>0)
+        assert(self.mutations>0)
+        self.charm[mutLine] = (self.errors[mutLine]-self.progress[mutLine])/(float(self.mutations)/float(l))
+        if errorLine <= l:
+          self.charm[errorLine] = (self.errors[errorLine]-self.progress[errorLine])/(float(self.mutations)/float(l))
+        self.delta = 1.0/math.sqrt(float(self.mutations)/float(l))
+
+    def recount(self):
+        """Recompute mutations, charm and delta from progress and errors."""
+        l = self.lines
+        self.mutations = sum(self.progress)
+        if self.mutations == 0:
+          self.delta = float("inf")
+          return
+        scale = float(self.mutations)/float(l)
+        for li in range(1, l+1):
+          self.charm[li] = (self.errors[li]-self.progress[li])/scale
+        self.delta = 1.0/math.sqrt(scale)
+
+    def renamed(self, path):
+        """The same counts for another path, sharing the arrays."""
+        other = copy(self)
+        other.path = path
+        other.pairs = None
+        return other
+
+    def needed(self, deltamax):
+        """How many more mutants it takes to bring delta under deltamax."""
+        l = float(self.lines)
+        total = max(int(math.ceil(l/(deltamax*deltamax))) - 1, self.mutations, 1)
+        while 1.0/math.sqrt(total/l) > deltamax:
+          total = total + 1
+        return total - self.mutations
+
+    def rows(self):
+        """Rows for the results csv: file, line, mutants, errors, charm, delta."""
+        for li in range(1, self.lines):
+          yield [
+            self.path,
+            li,
+            self.progress[li],
+            self.errors[li],
+            self.charm[li],
+            self.delta
+          ]
@@ -32,17 +32,39 @@ from shutil import copyfile
 from tempfile import mkstemp, mkdtemp
 import os, re
 
-from multiprocessing import Process, Queue
+from estimatecharm import flexibleTokenize
+from estimatecharm.mutantExecutor import *
+try:
+  from estimatecharm.asyncMutantExecutor import asyncExecutor
+except (ImportError, SyntaxError):
+  asyncExecutor = None
+try:
+  from estimatecharm.subinterpreterExecutor import subinterpreterExecutor
+except (ImportError, SyntaxError):
+  subinterpreterExecutor = None
 try:
-  from Queue import Empty
+  from estimatecharm.charmProfile import memoryProfiler
 except ImportError:
-  from queue import Empty
-from estimatecharm import flexibleTokenize
+  memoryProfiler = None
+from estimatecharm.charmCorpus import *
+from estimatecharm.charmStats import *
+from estimatecharm.charmCluster import *
+from estimatecharm.charmCoverage import unreached, baseSignatures
+from estimatecharm.charmMetrics import charmMetrics
+from estimatecharm.charmHistory import charmHistory, unchangedFile
+from estimatecharm.charmMatrix import charmMatrix
+from estimatecharm.charmSpace import tokenSpace, charSpace
+from estimatecharm.charmBudget import charmBudget
+from estimatecharm.charmMakers import make, madeElsewhere
 
+from multiprocessing import Process
+from threading import Lock
+from itertools import islice
+from heapq import heapify, heappop, heappush
 import pdb
 import math
-
-virtualEnvActivate = os.getenv("VIRTUALENV_ACTIVATE", None)
+import time
+import hashlib
 
 nonWord = re.compile('\\W+')
 beginsWithWhitespace = re.compile('^\\w')
@@ -50,215 +72,538 @@ numeric = re.compile('[0-9]')
 punct = re.compile('[~!@#$%^%&*(){}<>.,;\\[\\]`/\\\=\\-+]')
 funny = re.compile(flexibleTokenize.Funny)
 name = re.compile(flexibleTokenize.Name)
+colon = re.compile(':')
+
+def laidOutAlike(at, lexeme, otherAt, other):
+    """
+    True if lexeme and other, on the same column, are laid out alike by
+    deLex() from (line, column) at and otherAt, so tokens after them that
+    are only moved down or up are too.
+    """
+    if lexeme.start.col != other.start.col:
+      return False
+    def relative(at, lexeme):
+      (line, col) = at
+      return (lexeme.start.line - line, col if line >= lexeme.start.line else 0)
+    return relative(at, lexeme) == relative(otherAt, other)
+
+# The fields of a mutant's details, as in the details file.
+detailColumns = ["file", "mutLine", "errorLine", "errors", "mutants",
+                 "mutations", "charm", "delta", "operator", "type", "value",
+                 "exception", "online", "filename", "function", "inferred"]
 
-class HaltingError(Exception):
-  def __init__(self, value):
-    self.value = value
-  def __str__(self):
-    return repr(self.value)
-
-def runFile(q,path):
-    if not virtualEnvActivate is None:
-      if sys.version_info >= (3,0):
-        exec(compile(open(virtualEnvActivate, "rb").read(), virtualEnvActivate, 'exec'), dict(__file__=virtualEnvActivate))
-      else:
-        execfile(virtualEnvActivate, dict(__file__=virtualEnvActivate))
-    try:
-        runpy.run_path(path)
-    except SyntaxError as se:
-        ei = sys.exc_info();
-        eip = (ei[0], str(ei[1]), traceback.extract_tb(ei[2]))
-        try:
-          eip[2].append(ei[1][1])
-        except IndexError:
-          eip[2].append((se.filename, se.lineno, None, None))
-        q.put(eip)
-        return
-    except Exception as e:
-        ei = sys.exc_info();
-        info("run_path exception:", exc_info=ei)
-        eip = (ei[0], str(ei[1]), traceback.extract_tb(ei[2]))
-        q.put(eip)
-        return
-    q.put((None, "None", [(path, None, None, None)]))
-    
 class charmFile(object):
     
-    def __init__(self, path, language, tempDir):
+    def __init__(self, path, language, tempDir, executor=None, cache=None, source=None, inMemory=False):
         self.path = path
         self.lm = language
-        self.f = open(path)
-        self.original = self.f.read()
+        if source is None:
+          self.f = open(path)
+          self.original = self.f.read()
+          self.f.close()
+        else:
+          self.original = source
+        self.digest = hashlib.sha1(self.original.encode('utf-8')).hexdigest()
         self.lexed = self.lm(self.original)
         self.scrubbed = self.lexed.scrubbed()
+        # What an unmutated mutant would be, for mutants to be sent as edits
+        # of, with where in it each token is laid out: its offset and the
+        # (line, column) deLex() is at before it.
+        self.laidOut = [(0, (1, 0))]
+        texts = list()
+        for (text, at) in self.scrubbed.layout():
+          texts.append(text)
+          self.laidOut.append((self.laidOut[-1][0] + len(text), at))
+        self.base = "".join(texts)
         self.lines = self.lexed[-1].end.line
         self.lineStart = [-1 for i in range(0, self.lines+1)]
         self.lineTokens = [0 for i in range(0, self.lines+1)]
         for i in range(0, len(self.scrubbed)):
           line = self.scrubbed[i].start.line
-          self.lineTokens[line] = self.lineTokens[line] + 1
+          if self.scrubbed[i].type != 'ENDMARKER':
+            self.lineTokens[line] = self.lineTokens[line] + 1
           for j in range(line, 0, -1):
             if self.lineStart[j] == -1:
               self.lineStart[j] = i
             else:
               break
-        self.f.close()
-        self.mutatedLexemes = None
+        self.mutatedEdit = None
+        self.mutatedBase = None
         self.mutatedLocation = None
+        # Operator name -> mutantSpace, made when first needed.
+        self.spaces = dict()
         self.tempDir = tempDir
-        r = self.run(path)
-        info("Ran %s, got %s" % (self.path, r[1]))
-        if (r[0] != None):
-          raise Exception("Couldn't run file: %s because %s" % (self.path, r[1]))
+        self.executor = processExecutor() if executor is None else executor
+        activate = self.executor.activate
+        self.baseline = None if cache is None else cache.get(self.digest, path, activate)
+        if self.baseline is None:
+          startTime = time.time()
+          if inMemory:
+            (r, modules, executed) = self.executor.baselineSource(source)
+          else:
+            (r, modules, executed) = self.executor.baseline(path)
+          self.baseline = dict(
+            digest=self.digest,
+            path=self.path,
+            activate=activate,
+            exception=None if r[0] is None else r[0].__name__,
+            message=r[1],
+            runtime=time.time() - startTime,
+            modules=modules,
+            executed=executed
+            )
+          if cache is not None:
+            cache.put(self.baseline)
+        self.modules = self.baseline['modules']
+        executed = self.baseline.get('executed', None)
+        self.executed = None if executed is None else frozenset(executed)
+        self.ran = None
+        info("Ran %s, got %s" % (self.path, self.baseline['message']))
+        if (self.baseline['exception'] != None):
+          raise Exception("Couldn't run file: %s because %s" % (self.path, self.baseline['message']))
         #runpy.run_path(self.path)
     
     def run(self, path):
-        q = Queue()
-        p = Process(target=runFile, args=(q,path,))
-        p.start()
-        try:
-          r = q.get(True, 10)
-        except Empty as e:
-          r = (HaltingError, "Didn't halt.", [(path, None, None, None)])
-        p.terminate()
-        p.join()
-        assert not p.is_alive()
-        #assert r[2][-1][2] != "_get_code_from_file" # This seems to be legit
-        return r
-
+        return self.executor.run(path, self.modules)
     
-    def mutate(self, lexemes, location):
+    def mutate(self, lexemes, location, pos):
+        """Keep a mutant made by changing scrubbed's token at pos, as an edit of base."""
         assert isinstance(lexemes, ucSource)
-        self.mutatedLexemes = self.lm(lexemes.deLex())
+        removed = 0 if len(lexemes) > len(self.scrubbed) else 1
+        added = len(lexemes) - len(self.scrubbed) + removed
+        (offset, at) = self.laidOut[pos]
+        laying = lexemes.layout(pos, at)
+        texts = list()
+        for i in range(0, added):
+          (text, at) = next(laying)
+          texts.append(text)
+        old = pos + removed
+        new = pos + added
+        while old < len(self.scrubbed) and not laidOutAlike(self.laidOut[old][1], self.scrubbed[old], at, lexemes[new]):
+          (text, at) = next(laying)
+          texts.append(text)
+          old = old + 1
+          new = new + 1
+        laying.close()
+        end = self.laidOut[old][0]
+        (start, deleted, inserted) = sourceEdit(self.base[offset:end], "".join(texts))
+        self.mutatedEdit = (offset + start, deleted, inserted)
+        self.mutatedBase = self.base
+        self.mutatedLocation = location
+    
+    def mutateText(self, edit, location):
+        """Keep a mutant made by editing original's text, as that edit of it."""
+        self.mutatedEdit = edit
+        self.mutatedBase = self.original
         self.mutatedLocation = location
         
+    def takeMutant(self):
+        """Hand over the current mutant as (source, location), forgetting it."""
+        (edit, location) = self.takeEdit()
+        return (applyEdit(self.mutatedBase, edit), location)
+
+    def takeEdit(self):
+        """
+        Hand over the current mutant as (edit, location), forgetting it. The
+        edit is of base, or of original for the textual operators.
+        """
+        edit = self.mutatedEdit
+        self.mutatedEdit = None
+        return (edit, self.mutatedLocation)
+
+    def unreached(self, edit):
+        """True if a mutant can be classified without running it."""
+        if self.executed is None:
+          return False
+        if self.ran is None:
+          self.ran = baseSignatures(self.base, self.path, self.executed)
+        return unreached(self.mutatedBase, self.path, self.executed, edit, self.ran)
+        
     def runMutant(self):
-        (mutantFileHandle, mutantFilePath) = mkstemp(suffix=".py", prefix="mutant", dir=self.tempDir)
-        self.mutantFilePath = mutantFilePath
-        mutantFile = os.fdopen(mutantFileHandle, "w")
-        mutantFile.write(self.mutatedLexemes.deLex())
-        mutantFile.close()
-        r = self.run(mutantFilePath)
-        os.remove(mutantFilePath)
+        (source, location) = self.takeMutant()
+        (self.mutantFilePath, r) = self.executor.runMutant(source, self.modules)
         return r
+    
+    def shed(self):
+        """Drop everything but the path and line count once estimation is done."""
+        self.original = None
+        self.lexed = None
+        self.scrubbed = None
+        self.base = None
+        self.laidOut = None
+        self.executed = None
+        self.ran = None
+        self.lineStart = None
+        self.lineTokens = None
+        self.mutatedEdit = None
+        self.mutatedBase = None
+        self.mutatedLocation = None
+        self.spaces = None
         
 class estimateCharm(object):
     
     def addCharmFile(self, files):
-          """Add a file for validation..."""
+          """
+          Add a file for validation... Files are loaded lazily by estimate().
+          Besides paths, files can hold (name, source) pairs for source that
+          isn't in a file.
+          """
           files = [files] if isinstance(files, str) else files
-          assert isinstance(files, list)
-          for fi in files:
-            vfi = charmFile(fi, self.lm, self.tempDir)
-            if len(vfi.lexed) > 1:
-              self.charmFiles.append(vfi)
+          self.corpus.add(files)
+    
+    def loadCharmFile(self, fi, source=None):
+          loaded = self.loadInput(fi, source)
+          if self.budget is not None and not isinstance(loaded, charmFile):
+            # It won't get mutants, so it needs no share of the time.
+            self.budget.discount(fi[0] if isinstance(fi, tuple) else fi)
+          return loaded
+
+    def loadInput(self, fi, source=None):
+          inMemory = isinstance(fi, tuple)
+          if inMemory:
+            (fi, source) = fi
+          try:
+            if source is None:
+              with open(fi) as f:
+                source = f.read()
+            digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+            with self.lock:
+              first = self.digests.setdefault(digest, fi)
+            if first != fi:
+              return duplicateFile(fi, digest, first)
+            if self.history is not None:
+              skipped = self.history.skip(fi, source, self.deltamax)
+              if skipped is not None:
+                return skipped
+            vfi = charmFile(fi, self.lm, self.tempDir, self.executor, self.baselines, source, inMemory)
+          except Exception as e:
+            warning("Skipping %s: %s" % (fi, e))
+            self.failures.append((fi, str(e)))
+            return None
+          if len(vfi.lexed) > 1:
+            return vfi
+          return None
+    
+    def reportFailures(self):
+          """Summarize input files that couldn't be estimated."""
+          if len(self.failures) == 0:
+            return
+          warning("%i input files failed baseline validation:" % (len(self.failures)))
+          for (fi, reason) in self.failures:
+            warning("  %s: %s" % (fi, reason))
+
+    def reportCopies(self):
+          """Summarize input files that were copies of ones never estimated."""
+          copies = [fi for waiting in self.copies.values() for fi in waiting]
+          if len(copies) == 0:
+            return
+          info("%i input files are copies of files that weren't estimated:" % (len(copies)))
+          for fi in copies:
+            debug("  %s, a copy of %s" % (fi.path, fi.first))
+    
+    def locateError(self, fi, runException, mutantFilePath=None):
+        """Find the line of fi a mutant's exception was reported on."""
+        if mutantFilePath is None:
+          mutantFilePath = fi.mutantFilePath
+        l = fi.lines
+        errorLine = None
+        filename = None
+        func = None
+        text = None
+        if (runException[0] == None):
+          exceptionName = "None"
+        else:
+          exceptionName = runException[0].__name__
+          for location in reversed(runException[2]):
+            if (location[0] == mutantFilePath):
+              filename, errorLine, func, text = location
+              break
+        if errorLine == None:
+          errorLine = l+1
+        if errorLine > l+1: # This can be caused by inserting giant multi-line string literals, in python docstrinsg
+          errorLine = l+1
+        return (errorLine, exceptionName, filename, func)
+    
+    def mutationLines(self, fi, stats=None, deltamax=None):
+        """
+        Lines to mutate, round robin over the lines of fi that have tokens.
+        If stats already has mutants, carried over from an earlier run, lines
+        short of their share of what deltamax takes come first, the furthest
+        short (usually the ones that changed) before the rest.
+        """
+        l = fi.lines
+        if stats is not None and stats.mutations > 0:
+          tokened = [line for line in range(1, l+1) if fi.lineTokens[line] > 0]
+          share = int(math.ceil(float(stats.mutations + stats.needed(deltamax)) / max(len(tokened), 1)))
+          short = [(stats.progress[line] - share, line)
+                   for line in tokened if stats.progress[line] < share]
+          heapify(short)
+          while len(short) > 0:
+            (deficit, line) = heappop(short)
+            yield line
+            if deficit + 1 < 0:
+              heappush(short, (deficit + 1, line))
+        mi = 0
+        while True:
+          mi = mi + 1
+          mline = (mi % l) + 1
+          if fi.lineTokens[mline] > 0:
+            yield mline
+    
+    def mutants(self, fi, stats, mutation, deltamax, needed=None):
+        """
+        What fi's mutants are made with, as (make, lines) for outcomes(),
+        sampling mutation's space without replacement if exhaustive is "sample".
+        """
+        if needed is None:
+          needed = stats.needed(deltamax)
+        space = None
+        # Counts carried over from an earlier run were sampled with replacement.
+        if self.exhaustive == "sample" and stats.mutations == 0:
+          space = self.space(fi, mutation)
+        if space is not None:
+          return (spaces[mutation][1], space.sample(needed))
+        return (mutation, islice(self.mutationLines(fi, stats, deltamax), needed))
+
+    def outcomes(self, fi, mutation, lines):
+        """
+        Run a mutant of fi for each line in lines, yielding outcomes as they
+        finish, or last a string saying why a mutation couldn't be made.
+        """
+        merrors = list()
+        inferred = list()
+        # Mutants sent to the executor and not back from it yet.
+        flying = [0]
+        def mutants():
+          if self.makers > 0:
+            made = madeElsewhere(self, fi, mutation, lines, self.makers, self.ahead)
+          else:
+            made = (make(self, fi, mutation, mline) for mline in lines)
+            if self.ahead > 0:
+              made = ahead(made, self.ahead)
+          try:
+            for (kind, mutant) in made:
+              if kind == "error":
+                merrors.append(mutant)
+                return
+              if kind == "inferred":
+                inferred.append(mutant)
+                continue
+              self.metrics.sent()
+              flying[0] = flying[0] + 1
+              yield mutant
+          finally:
+            made.close()
+        def skipped():
+          while len(inferred) > 0:
+            location = inferred.pop(0)
+            yield (location.start.line, fi.lines+1, "None", None, None,
+                   location.type, location.value, True)
+        made = mutants()
+        base = fi.original if mutation in textual else fi.base
+        results = self.executor.streamEdits(base, made, fi.modules)
+        try:
+          for (location, mutantFilePath, runException) in results:
+            self.metrics.received()
+            flying[0] = flying[0] - 1
+            for outcome in skipped():
+              yield outcome
+            (errorLine, exceptionName, filename, func) = self.locateError(fi, runException, mutantFilePath)
+            #info(" ".join(map(str, [fi.path, location.start.line, fi.lines, location])))
+            #info(" ".join(map(str, [filename, errorLine, func])))
+            #info(runException)
+            yield (
+              location.start.line,
+              errorLine,
+              exceptionName,
+              filename,
+              func,
+              location.type,
+              location.value,
+              False
+              )
+        finally:
+          # Stop making mutants before anything else draws random numbers.
+          results.close()
+          made.close()
+          # Those still out when the stream was closed never come back.
+          self.metrics.received(flying[0])
+        for outcome in skipped():
+          yield outcome
+        for merror in merrors:
+          yield merror
+    
+    def record(self, stats, mutation, outcome, deltamax):
+        """
+        Count a mutant's outcome towards stats and write its details,
+        returning them as a tuple in the order of detailColumns.
+        """
+        (mutLine, errorLine, exceptionName, filename, func, locationType, locationValue, inferred) = outcome
+        l = stats.lines
+        if (mutLine == errorLine):
+          online = True
+        else:
+          online = False
+        stats.record(mutLine, errorLine, exceptionName)
+        self.metrics.recorded(stats, outcome, deltamax)
+        if self.budget is not None:
+          self.budget.recorded()
+        if self.profiler is not None:
+          self.profiler.mutant()
+        if self.logMutants:
+          debug(" ".join(map(str, [
+              str(stats.mutations) + "/" + str(int(math.ceil(float(l)/(deltamax*deltamax)))),
+              mutLine, errorLine,
+              stats.errors[errorLine],
+              stats.progress[mutLine],
+              stats.charm[mutLine],
+              stats.delta
+            ])))
+        detail = (
+          stats.path,
+          mutLine,
+          errorLine,
+          stats.errors[errorLine],
+          stats.progress[mutLine],
+          stats.mutations,
+          stats.charm[mutLine],
+          stats.delta,
+          mutation.__name__, 
+          locationType,
+          nonWord.sub('', locationValue), 
+          exceptionName, 
+          online,
+          filename,
+          func,
+          inferred)
+        if self.detailsCsv is not None:
+          self.detailsCsv.writerow(detail)
+          self.detailsFile.flush()
+        return detail
+    
+    def fileStats(self, fi):
+        stats = self.stats.get(fi.path, None)
+        if stats is None:
+          if isinstance(fi, unchangedFile):
+            stats = fi.stats
+          elif self.history is not None:
+            stats = self.history.carry(fi)
+          if stats is None:
+            stats = charmStats(fi.path, fi.lines, lineErrors=self.history is not None)
+          if self.matrix is not None and stats.pairs is None:
+            # Carried over counts aren't in the matrix, only this run's.
+            stats.pairs = dict()
+          self.stats[fi.path] = stats
+          if self.profiler is not None:
+            self.profiler.snapshot("loaded " + fi.path)
+        return stats
+    
+    def finishFile(self, fi, stats):
+        """
+        Write out a file's per-line results and let go of the file,
+        returning the charmStats of the copies of it this finishes too.
+        """
+        if self.csv is not None:
+          for row in stats.rows():
+            self.csv.writerow(row)
+        self.metrics.finished(fi.path)
+        if self.matrix is not None:
+          self.matrix.add(stats)
+        if self.history is not None:
+          self.history.record(fi, stats)
+        fi.shed()
+        if self.profiler is not None:
+          self.profiler.snapshot("finished " + fi.path)
+        self.estimated[fi.digest] = stats
+        return [self.finishCopy(copy, stats) for copy in self.copies.pop(fi.digest, [])]
+
+    def finishCopy(self, fi, stats):
+        """Write out the results of the file duplicateFile fi is a copy of, as fi's."""
+        stats = stats.renamed(fi.path)
+        self.stats[fi.path] = stats
+        if self.csv is not None:
+          for row in stats.rows():
+            self.csv.writerow(row)
+        self.metrics.finished(fi.path)
+        if self.matrix is not None:
+          self.matrix.alias(fi.path, fi.first)
+        return stats
+
+    def copied(self, fi):
+        """
+        Finish a duplicateFile, returning its charmStats, or None if the file
+        it copies isn't finished yet; finishing that will finish this too.
+        """
+        stats = self.estimated.get(fi.digest, None)
+        if stats is None:
+          self.copies.setdefault(fi.digest, []).append(fi)
+          return None
+        return self.finishCopy(fi, stats)
     
     def estimate(self, mutation, deltamax):
         """Run main estimation loop."""
-        for fi in self.charmFiles:
-          assert isinstance(fi, charmFile)
-          n = len(fi.scrubbed)
-          l = fi.lexed[-1].end.line
-          if fi.path in self.progress:
-            progress = self.progress[fi.path]
-            errors = self.errors[fi.path]
-            mutations = self.mutations[fi.path]
-            charm = self.charm[fi.path]
-          else:
-            progress = [0 for i in range(1,l+3)]
-            progress[0] = None # Line numbers start with 1
-            errors = [0 for i in range(1,l+3)]
-            errors[0] = None
-            charm = [0 for i in range(1,l+3)]
-            charm[0] = None
-            mutations = 0
-          info("Testing " + str(progress) + " " + fi.path)
-          delta = float("inf")
-          mi = 0
-          while (delta > deltamax):
-            mi = mi + 1
-            mline = (mi % l) + 1
-            if fi.lineTokens[mline] > 0:
-              merror = mutation(self, fi, mline)
-              if merror is not None:
-                info(merror)
+        for stats in self.estimating(mutation, deltamax):
+          pass
+        self.reportFailures()
+        self.reportCopies()
+
+    def estimating(self, mutation, deltamax, details=False):
+        """
+        The main estimation loop as a generator, yielding each file's
+        charmStats once it's finished and, if details is on, the details of
+        every mutant (as record() returns them) as it's counted. With a
+        budget, files get mutants until it says they had their share, and
+        once it runs out the rest of the corpus isn't estimated.
+        """
+        self.deltamax = deltamax
+        for fi in self.corpus:
+          if self.budget is not None:
+            if self.budget.expired():
+              break
+            self.budget.reach(fi.path, getattr(fi, 'lines', None))
+          if isinstance(fi, duplicateFile):
+            stats = self.copied(fi)
+            if stats is not None:
+              yield stats
+            continue
+          assert isinstance(fi, (charmFile, unchangedFile))
+          stats = self.fileStats(fi)
+          needed = stats.needed(deltamax)
+          if needed > 0:
+            info("Testing " + fi.path)
+            (make, lines) = self.mutants(fi, stats, mutation, deltamax)
+            if self.budget is not None:
+              self.budget.start(stats)
+            outcomes = self.outcomes(fi, make, lines)
+            for outcome in outcomes:
+              if isinstance(outcome, str):
+                info(outcome)
+                break
+              detail = self.record(stats, mutation, outcome, deltamax)
+              if details:
+                yield detail
+              if self.budget is not None and self.budget.enough(stats):
                 break
-              runException = fi.runMutant()
-              errorLine = None
-              filename = None
-              func = None
-              text = None
-              if (runException[0] == None):
-                exceptionName = "None"
-              else:
-                exceptionName = runException[0].__name__
-                for location in reversed(runException[2]):
-                  if (location[0] == fi.mutantFilePath):
-                    filename, errorLine, func, text = location
-                    break
-              if errorLine == None:
-                errorLine = l+1
-              if errorLine > l+1: # This can be caused by inserting giant multi-line string literals, in python docstrinsg
-                errorLine = l+1
-              mutLine = fi.mutatedLocation.start.line
-              #info(" ".join(map(str, [fi.path, mutLine, l, fi.mutatedLocation])))
-              #info(" ".join(map(str, [filename, errorLine, func, text])))
-              #info(runException)
-              if (mutLine == errorLine):
-                online = True
-              else:
-                online = False
-              errors[errorLine] = errors[errorLine] + 1
-              progress[mutLine] = progress[mutLine] + 1
-              mutations = mutations + 1
-              assert(l>0)
-              assert(mutations>0)
-              charm[mutLine] = (errors[mutLine]-progress[mutLine])/(float(mutations)/float(l))
-              if errorLine <= l:
-                charm[errorLine] = (errors[errorLine]-progress[errorLine])/(float(mutations)/float(l))
-              delta = 1.0/math.sqrt(float(mutations)/float(l))
-              info(" ".join(map(str, [
-                  str(mutations) + "/" + str(int(math.ceil(float(l)/(deltamax*deltamax)))),
-                  mutLine, errorLine,
-                  errors[errorLine],
-                  progress[mutLine],
-                  charm[mutLine],
-                  delta
-                ])))
-              self.detailsCsv.writerow([
-                fi.path, 
-                mutLine,
-                errorLine,
-                errors[errorLine],
-                progress[mutLine],
-                mutations,
-                charm[mutLine],
-                delta,
-                mutation.__name__, 
-                fi.mutatedLocation.type,
-                nonWord.sub('', fi.mutatedLocation.value), 
-                exceptionName, 
-                online,
-                filename,
-                func])
-              self.detailsFile.flush()
-          for li in range(1,l):
-            self.csv.writerow([
-              fi.path,
-              li,
-              progress[li],
-              errors[li],
-              charm[li],
-              delta
-            ])
+            outcomes.close()
+          copies = self.finishFile(fi, stats)
+          yield stats
+          for stats in copies:
+            yield stats
+        self.reportBudget()
+
+    def reportBudget(self):
+        """Say how much of the corpus a budget that ran out left unestimated."""
+        if self.budget is not None and self.budget.expired():
+          info("Out of time with %i input files not estimated" % (self.budget.unreached()))
             
     def deleteRandom(self, vFile):
         """Delete a random token from a file."""
         ls = copy(vFile.scrubbed)
-        token = ls.pop(randint(0, len(ls)-1))
+        pos = randint(0, len(ls)-1)
+        token = ls.pop(pos)
         if token.type == 'ENDMARKER':
           return self.deleteRandom(vFile)
-        vFile.mutate(ls, token)
+        vFile.mutate(ls, token, pos)
         return None
             
     def insertRandom(self, vFile):
@@ -268,12 +613,12 @@ class estimateCharm(object):
         inserted = ls.insert(pos, token)
         if inserted[0].type == 'ENDMARKER':
           return self.insertRandom(vFile)
-        vFile.mutate(ls, inserted[0])
+        vFile.mutate(ls, inserted[0], pos)
         return None
             
     def replaceRandom(self, vFile, targetLine=None):
         ls = copy(vFile.scrubbed)
-        token = ls[randint(0, len(ls)-1)]
+        token = ls[randint(0, len(ls)-2)]
         if targetLine == None:
           pos = randint(0, len(ls)-2)
         else:
@@ -281,7 +626,7 @@ class estimateCharm(object):
           nextLineStart = len(vFile.scrubbed)
           if targetLine < vFile.lines:
             nextLineStart = vFile.lineStart[targetLine+1]
-          if (lineStart > nextLineStart):
+          if (nextLineStart > lineStart):
             pos = randint(lineStart, nextLineStart-1)
           else:
             pos = lineStart
@@ -290,11 +635,9 @@ class estimateCharm(object):
           assert(ls[pos].start.line <= targetLine and targetLine <= ls[pos].end.line)
         oldToken = ls.pop(pos)
         if oldToken.type == 'ENDMARKER':
-          return self.replaceRandom(vFile)
+          return self.replaceRandom(vFile, targetLine)
         inserted = ls.insert(pos, token)
-        if inserted[0].type == 'ENDMARKER':
-          return self.replaceRandom(vFile)
-        vFile.mutate(ls, inserted[0])
+        vFile.mutate(ls, inserted[0], pos)
         return None
         
     def dedentRandom(self, vFile):
@@ -303,22 +646,21 @@ class estimateCharm(object):
         while True:
           line = randint(0, len(lines)-1)
           if beginsWithWhitespace.match(lines[line]):
-            lines[line][0] = ''
             break
-        vFile.mutatedLexemes = vFile.lm("".join(lines))
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.INDENT, ' ', (line+1, 0), (line+1, 0)))
+        lineStart = sum(len(l) for l in lines[:line])
+        vFile.mutateText((lineStart, 1, ""), pythonLexeme.fromTuple((token.INDENT, ' ', (line+1, 0), (line+1, 0))))
         return None
         
     def indentRandom(self, vFile):
         s = copy(vFile.original)
         lines = s.splitlines(True);
         line = randint(0, len(lines)-1)
+        lineStart = sum(len(l) for l in lines[:line])
         if beginsWithWhitespace.match(lines[line]):
-          lines[line] = lines[line][0] + lines[line]
+          indent = lines[line][0]
         else:
-          lines[line] = " " + lines[line]
-        vFile.mutatedLexemes = vFile.lm("".join(lines))
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.INDENT, ' ', (line+1, 0), (line+1, 0)))
+          indent = " "
+        vFile.mutateText((lineStart, 0, indent), pythonLexeme.fromTuple((token.INDENT, ' ', (line+1, 0), (line+1, 0))))
         return None
     
     def punctRandom(self, vFile):
@@ -329,9 +671,7 @@ class estimateCharm(object):
         lineChar = len(linesbefore[-1])
         c = s[charPos:charPos+1]
         if (funny.match(c)):
-          new = s[:charPos] + s[charPos+1:]
-          vFile.mutatedLexemes = vFile.lm(new)
-          vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+          vFile.mutateText((charPos, 1, ""), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
           return None
         else:
           return self.punctRandom(vFile)
@@ -353,9 +693,7 @@ class estimateCharm(object):
           c = s[charPos:charPos+1]
           if (name.match(char)):
             break
-        new = s[:charPos] + char + s[charPos:]
-        vFile.mutatedLexemes = vFile.lm(new)
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+        vFile.mutateText((charPos, 0, char), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
         return None
 
     def deleteWordRandom(self, vFile):
@@ -368,9 +706,7 @@ class estimateCharm(object):
           c = s[charPos:charPos+1]
           if (name.match(c)):
             break
-        new = s[:charPos] + s[charPos+1:]
-        vFile.mutatedLexemes = vFile.lm(new)
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+        vFile.mutateText((charPos, 1, ""), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
         return None
         
     def insertPunctRandom(self, vFile):
@@ -386,9 +722,7 @@ class estimateCharm(object):
         line = len(linesbefore)
         lineChar = len(linesbefore[-1])
         c = s[charPos:charPos+1]
-        new = s[:charPos] + char + s[charPos:]
-        vFile.mutatedLexemes = vFile.lm(new)
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+        vFile.mutateText((charPos, 0, char), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
         return None
 
     def deleteNumRandom(self, vFile):
@@ -407,9 +741,7 @@ class estimateCharm(object):
           c = s[charPos:charPos+1]
           if (numeric.match(c)):
             break
-        new = s[:charPos] + s[charPos+1:]
-        vFile.mutatedLexemes = vFile.lm(new)
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+        vFile.mutateText((charPos, 1, ""), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
         return None
 
     def insertNumRandom(self, vFile):
@@ -420,9 +752,7 @@ class estimateCharm(object):
         line = len(linesbefore)
         lineChar = len(linesbefore[-1])
         c = s[charPos:charPos+1]
-        new = s[:charPos] + char + s[charPos:]
-        vFile.mutatedLexemes = vFile.lm(new)
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+        vFile.mutateText((charPos, 0, char), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
         return None
 
     def deletePunctRandom(self, vFile):
@@ -437,9 +767,7 @@ class estimateCharm(object):
           c = s[charPos:charPos+1]
           if (punct.match(c)):
             break
-        new = s[:charPos] + s[charPos+1:]
-        vFile.mutatedLexemes = vFile.lm(new)
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+        vFile.mutateText((charPos, 1, ""), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
         return None
 
     def colonRandom(self, vFile):
@@ -452,10 +780,59 @@ class estimateCharm(object):
           c = s[charPos:charPos+1]
           if (c == ':'):
             break
-        new = s[:charPos] + s[charPos+1:]
-        vFile.mutatedLexemes = vFile.lm(new)
-        vFile.mutatedLocation = pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar)))
+        vFile.mutateText((charPos, 1, ""), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
+        return None
+
+    def space(self, vFile, mutation):
+        """The mutantSpace of mutation for vFile, or None if it can't enumerate its mutants."""
+        if mutation not in spaces:
+          return None
+        key = mutation.__name__
+        if key not in vFile.spaces:
+          vFile.spaces[key] = spaces[mutation][0](vFile)
+        return vFile.spaces[key]
+
+    def deleteAt(self, vFile, i):
+        """Make mutant i of deleteRandom's space, deleting a token."""
+        (pos, choice) = self.space(vFile, DELETE)[i]
+        ls = copy(vFile.scrubbed)
+        token = ls.pop(pos)
+        vFile.mutate(ls, token, pos)
+        return None
+
+    def replaceAt(self, vFile, i):
+        """Make mutant i of replaceRandom's space, replacing a token with another."""
+        (pos, token) = self.space(vFile, REPLACE)[i]
+        ls = copy(vFile.scrubbed)
+        ls.pop(pos)
+        inserted = ls.insert(pos, token)
+        vFile.mutate(ls, inserted[0], pos)
+        return None
+
+    def deleteCharAt(self, vFile, charPos):
+        """Delete the character at charPos, like the character deleting operators."""
+        s = vFile.original
+        linesbefore = s[:charPos].splitlines(True)
+        line = len(linesbefore)
+        lineChar = len(linesbefore[-1])
+        c = s[charPos:charPos+1]
+        vFile.mutateText((charPos, 1, ""), pythonLexeme.fromTuple((token.OP, c, (line, lineChar), (line, lineChar))))
         return None
+
+    def punctAt(self, vFile, i):
+        return self.deleteCharAt(vFile, self.space(vFile, PUNCTUATION)[i][0])
+
+    def deleteWordAt(self, vFile, i):
+        return self.deleteCharAt(vFile, self.space(vFile, DELETEWORDCHAR)[i][0])
+
+    def deleteNumAt(self, vFile, i):
+        return self.deleteCharAt(vFile, self.space(vFile, DELETENUMCHAR)[i][0])
+
+    def deletePunctAt(self, vFile, i):
+        return self.deleteCharAt(vFile, self.space(vFile, DELETEPUNCTCHAR)[i][0])
+
+    def colonAt(self, vFile, i):
+        return self.deleteCharAt(vFile, self.space(vFile, COLON)[i][0])
       
     def __init__(self, source=None,
                  language=pythonSource,
@@ -463,48 +840,104 @@ class estimateCharm(object):
                  corpus=None,
                  details=None,
                  activate=None,
-                 tempDir="."):
+                 tempDir=".",
+                 executor=None,
+                 window=1,
+                 baselineJobs=1,
+                 baselineCacheFile=None,
+                 memoryLimit=None,
+                 inferUnreached=False,
+                 logMutants=False,
+                 profiler=None,
+                 history=None,
+                 matrix=None,
+                 exhaustive="off",
+                 budget=None,
+                 ahead=0,
+                 makers=0):
         if isinstance(source, str):
             raise NotImplementedError
-        elif isinstance(source, list):
+        elif hasattr(source, '__iter__'):
             self.charmFileNames = source
         else:
             raise TypeError("Constructor arguments!")
         self.notReleased = True
+        self.stats = dict()
         self.progress = dict()
         self.results = results
         self.details = details
         self.tempDir = tempDir
-        try:
-          self.csvFile = open(self.results, 'r')
-          self.csv = csv.reader(self.csvFile)
-          for row in self.csv:
-              self.progress[row[0]][row[1]] = row[2]
-              self.mutations[row[0]] = self.mutations[row[0]] + row[2]
-              self.errors[row[0]][row[1]] = row[3]
-              self.charm[row[0]][row[1]] = row[4]
-          self.csvFile.close()
-        except (IOError):
-          pass
-        self.csvFile = open(self.results + ".new", 'w')
-        self.csv = csv.writer(self.csvFile)
-        self.csv.writerow([
-          "file",
-          "line",
-          "mutants",
-          "errors",
-          "charm",
-          "delta"
-        ])
-        self.detailsFile = open(self.details, 'a')
-        self.detailsCsv = csv.writer(self.detailsFile)
+        self.inferUnreached = inferUnreached
+        self.logMutants = logMutants
+        self.profiler = profiler
+        self.history = history
+        self.matrix = None if matrix is None else charmMatrix(matrix)
+        self.exhaustive = exhaustive
+        self.ahead = ahead
+        self.makers = makers
+        self.budget = budget
+        if budget is not None:
+          self.charmFileNames = budget.scan(self.charmFileNames)
+        self.lock = Lock()
+        self.digests = dict()
+        self.estimated = dict()
+        self.copies = dict()
+        self.deltamax = None
+        if profiler is not None:
+          profiler.start()
+        if executor is None:
+          executor = processExecutor(activate=activate, store=tempFileStore(tempDir))
+        elif activate is not None:
+          executor.activate = activate
+        self.executor = executor
+        self.executor.start()
+        self.csvFile = None
+        self.csv = None
+        self.detailsFile = None
+        self.detailsCsv = None
+        if self.results is not None:
+          try:
+            self.csvFile = open(self.results, 'r')
+            self.csv = csv.reader(self.csvFile)
+            for row in self.csv:
+                self.progress[row[0]][row[1]] = row[2]
+                self.mutations[row[0]] = self.mutations[row[0]] + row[2]
+                self.errors[row[0]][row[1]] = row[3]
+                self.charm[row[0]][row[1]] = row[4]
+            self.csvFile.close()
+          except (IOError):
+            pass
+          self.csvFile = open(self.results + ".new", 'w')
+          self.csv = csv.writer(self.csvFile)
+          self.csv.writerow([
+            "file",
+            "line",
+            "mutants",
+            "errors",
+            "charm",
+            "delta"
+          ])
+        if self.details is not None:
+          self.detailsFile = open(self.details, 'a')
+          self.detailsCsv = csv.writer(self.detailsFile)
         self.lm = language
-        self.charmFiles = list()
+        self.baselines = baselineCache(baselineCacheFile)
+        self.failures = list()
+        self.corpus = charmCorpus(self.loadCharmFile, window, baselineJobs, memoryLimit)
+        self.metrics = charmMetrics(self)
         self.addCharmFile(self.charmFileNames)
 
     def release(self):
         self.notReleased = False
         """Any cleanup goes here..."""
+        self.metrics.stop()
+        if self.profiler is not None:
+          self.profiler.stop()
+        if self.matrix is not None:
+          self.matrix.write()
+        if self.csvFile is not None:
+          self.csvFile.close()
+        self.executor.release()
         
     def __del__(self):
         """I am a destructor, but release should be called explictly."""
@@ -525,22 +958,184 @@ INSERTPUNCTCHAR = estimateCharm.insertPunctRandom
 DELETESPACE = estimateCharm.dedentRandom
 INSERTSPACE = estimateCharm.indentRandom
 
+# The operators that edit original's text rather than the token stream, so
+# their mutants are edits of original instead of base.
+textual = frozenset([
+  PUNCTUATION, NAMELIKE, COLON, DELETEWORDCHAR, INSERTWORDCHAR,
+  DELETENUMCHAR, INSERTNUMCHAR, DELETEPUNCTCHAR, INSERTPUNCTCHAR,
+  DELETESPACE, INSERTSPACE, estimateCharm.punctAt,
+  estimateCharm.deleteWordAt, estimateCharm.deleteNumAt,
+  estimateCharm.deletePunctAt, estimateCharm.colonAt,
+  ])
+
+# The operators that can enumerate their mutants: how to make the
+# mutantSpace of them for a charmFile, and the method making mutant i of it.
+spaces = {
+  DELETE: (lambda fi: tokenSpace(fi.scrubbed), estimateCharm.deleteAt),
+  REPLACE: (lambda fi: tokenSpace(fi.scrubbed, replace=True), estimateCharm.replaceAt),
+  PUNCTUATION: (lambda fi: charSpace(fi.original, funny), estimateCharm.punctAt),
+  NAMELIKE: (lambda fi: charSpace(fi.original, name), estimateCharm.deleteWordAt),
+  DELETEWORDCHAR: (lambda fi: charSpace(fi.original, name), estimateCharm.deleteWordAt),
+  DELETENUMCHAR: (lambda fi: charSpace(fi.original, numeric), estimateCharm.deleteNumAt),
+  DELETEPUNCTCHAR: (lambda fi: charSpace(fi.original, punct), estimateCharm.deletePunctAt),
+  COLON: (lambda fi: charSpace(fi.original, colon), estimateCharm.colonAt),
+}
+
+executors = {
+  "process": processExecutor,
+  "zygote": zygoteExecutor,
+}
+if asyncExecutor is not None:
+  executors["async"] = asyncExecutor
+if subinterpreterExecutor is not None:
+  executors["subinterpreter"] = subinterpreterExecutor
+
+def mutantOutput(value):
+        """Parse --mutant-output: discard, inherit or a number of characters."""
+        if value in ("discard", "inherit"):
+          return value
+        try:
+          size = int(value)
+        except ValueError:
+          size = 0
+        if size <= 0:
+          raise argparse.ArgumentTypeError("expected discard, inherit or a positive number, not %r" % (value))
+        return size
+
+def duration(value):
+        """Parse --time-budget: seconds, or a number of s, m or h."""
+        units = dict(s=1, m=60, h=3600)
+        scale = units.get(value[-1:], None)
+        try:
+          seconds = float(value if scale is None else value[:-1]) * (scale or 1)
+        except ValueError:
+          seconds = 0
+        if seconds <= 0:
+          raise argparse.ArgumentTypeError("expected a positive number of seconds, or of s, m or h, not %r" % (value))
+        return seconds
+
+def makeExecutor(kind="process", store="file", parallel=8, **kwargs):
+        """
+        An executors[kind] with a mutant store of kind store and kwargs, like
+        timeout, limits and output. Its arguments can be pickled, so workers
+        in processes of their own are started with them.
+        """
+        if kind in ("async", "subinterpreter"):
+          kwargs['concurrency'] = parallel
+        return executors[kind](store=openMutantStore(store), **kwargs)
+
+def runWorker(address, executor=dict(), activate=None, language=pythonSource, options=dict()):
+        """
+        Work for the coordinator at address until it's done, running mutants
+        with makeExecutor(**executor) and an estimateCharm given options.
+        """
+        v = estimateCharm(source=[], 
+                          language=language,
+                          activate=activate,
+                          executor=makeExecutor(**executor),
+                          **options
+                         )
+        try:
+          charmWorker(address, v).run()
+        finally:
+          v.release()
+
 def main():
-        logging.getLogger().setLevel(logging.DEBUG)
         parser=argparse.ArgumentParser(description="Estimates charm for Python source code.")
-        parser.add_argument("input_file", help="Python source file to estimate charm for.", nargs="+")
+        parser.add_argument("input_file", help="Python source file to estimate charm for. Directories are searched for files matching --glob, - reads newline-delimited paths from stdin and @list reads them from a file.", nargs="*")
+        parser.add_argument("-g", "--glob", help="Pattern for files to estimate when walking directories (may be repeated)", action="append", default=None)
+        parser.add_argument("-w", "--window", help="Number of input files to keep loaded ahead of estimation", default=1, type=int)
+        parser.add_argument("-j", "--baseline-jobs", help="Number of input files to validate (run unmutated) at once", default=1, type=int)
+        parser.add_argument("-m", "--memory-limit", help="Resident memory (in MiB) above which no more input files are loaded ahead", default=None, type=int)
+        parser.add_argument("-b", "--baseline-cache", help="File to cache unmutated runs of input files in, keyed by their contents", default=None)
+        parser.add_argument("-i", "--incremental", help="File of earlier results to estimate incrementally from and append to: unchanged files aren't run again and changed ones only get mutants where they changed", default=None)
         parser.add_argument("-o", "--results-file", help="File to store results in.", default="charm.csv")
+        parser.add_argument("-M", "--matrix-file", help="File to store mutant counts by mutated line, error line and exception in, as a NumPy .npz (like charm.npz)", default=None)
         parser.add_argument("-d", "--details-file", help="File to store extra detailed results in.", default="detail.csv")
-        parser.add_argument("-a", "--activate", help="VirtualEnv activate.py to run before input files (if any)", default=None)
+        parser.add_argument("-a", "--activate", help="VirtualEnv activate_this.py to run once per worker before input files (if any)", default=os.getenv("VIRTUALENV_ACTIVATE", None))
+        parser.add_argument("-t", "--time-budget", help="Stop after this long (like 90, 30m or 2h), spreading the time over the input files so the worst delta is as small as it allows, but no smaller than --maximum-error", default=None, type=duration)
         parser.add_argument("-e", "--maximum-error", help="Sets the maximum allowed error (the minimum precision) of the results", default=0.1, type=float)
+        parser.add_argument("--exhaustive", help="Whether operators that can enumerate their mutants sample them without replacement, round robin over the lines (sample), or with replacement like the rest (off)", choices=["off", "sample"], default="off")
+        parser.add_argument("-s", "--mutant-store", help="Where to put mutant files: plain files in the current directory, a private tmpfs directory or anonymous memfd files", choices=mutantStores, default="file")
+        parser.add_argument("-x", "--executor", help="How to run mutants: a fresh process each, forked from a warm zygote that has already imported what the input files import, as fresh interpreters driven by asyncio, or in subinterpreters of one process (Python 3.14 or later)", choices=sorted(executors.keys()), default="process")
+        parser.add_argument("-z", "--zygote", help="Same as --executor zygote", action="store_true")
+        parser.add_argument("-p", "--parallel", help="Number of mutants the async and subinterpreter executors keep running at once", default=8, type=int)
+        parser.add_argument("-l", "--lexer", help="How to tokenize input files and mutants: the Python 2 era flexible tokenizer, or the interpreter's own tokenize module, falling back to the flexible one for code it rejects (workers must use the coordinator's)", choices=sorted(lexers.keys()), default="flexible")
+        parser.add_argument("--mutant-output", help="What to do with what mutants print: discard it, inherit this process's stdout and stderr, or keep the last N characters of it for -v to log", default="discard", type=mutantOutput)
+        parser.add_argument("--limit-memory", help="Address space (in MiB) each mutant may use, a forked mutant's including what the zygote preloaded", default=None, type=int)
+        parser.add_argument("--limit-cpu", help="CPU seconds each mutant may use", default=None, type=int)
+        parser.add_argument("--limit-processes", help="Processes the user may have while a mutant runs (RLIMIT_NPROC), limiting what mutants can fork", default=None, type=int)
+        parser.add_argument("--ahead", help="Number of mutants to make ahead of the executor, on a thread unless --makers is given (0 makes each as the executor asks for it; the thread is still running when the process and zygote executors fork)", default=0, type=int)
+        parser.add_argument("--makers", help="Number of processes forked for each input file to make mutants ahead in, in parallel, instead of a thread (for long files, where making a mutant takes longer than running it)", default=0, type=int)
+        parser.add_argument("--infer-unreached", help="Infer that mutants on lines the unmutated file never reached, inside functions, don't fail instead of running them", action="store_true")
+        parser.add_argument("-v", "--log-mutants", help="Log every mutant's outcome and exception (slow)", action="store_true")
+        parser.add_argument("--metrics-file", help="File to rewrite with progress metrics in the Prometheus text format", default=None)
+        parser.add_argument("--metrics-port", help="Serve progress metrics on http://127.0.0.1:PORT/metrics", default=None, type=int)
+        parser.add_argument("--metrics-interval", help="Seconds between rewrites of --metrics-file", default=10.0, type=float)
+        parser.add_argument("--profile-memory", help="Trace memory allocations and write reports of the top allocating functions to this file", default=None)
+        parser.add_argument("--profile-every", help="Number of mutants between --profile-memory snapshots", default=1000, type=int)
+        parser.add_argument("-C", "--coordinator", help="Listen on HOST:PORT and hand mutants out to workers instead of running them here", default=None)
+        parser.add_argument("-W", "--workers", help="Number of local worker processes to start for the coordinator", default=0, type=int)
+        parser.add_argument("--abandon", help="Seconds the coordinator waits with no workers connected before giving up", default=120.0, type=float)
+        parser.add_argument("--worker", help="Run mutants for the coordinator at HOST:PORT, from a checkout of the same tree", default=None)
         args = parser.parse_args()
-        v = estimateCharm(source=args.input_file, 
-                          language=pythonSource,
+        logging.getLogger().setLevel(logging.DEBUG if args.log_mutants else logging.INFO)
+        if args.zygote:
+          args.executor = "zygote"
+        limits = dict(
+          memory=None if args.limit_memory is None else args.limit_memory * 1024 * 1024,
+          cpu=args.limit_cpu,
+          processes=args.limit_processes)
+        executor = dict(kind=args.executor, store=args.mutant_store, parallel=args.parallel,
+                        limits=limits, output=args.mutant_output)
+        # The options that change how workers run mutants.
+        options = dict(inferUnreached=args.infer_unreached, ahead=args.ahead, makers=args.makers)
+        if args.worker is not None:
+          runWorker(parseAddress(args.worker), executor, args.activate, lexers[args.lexer], options)
+          return
+        if len(args.input_file) == 0:
+          parser.error("No input files.")
+        profiler = None
+        if args.profile_memory is not None:
+          if memoryProfiler is None:
+            parser.error("--profile-memory needs tracemalloc (Python 3.4 or later).")
+          profiler = memoryProfiler(args.profile_memory, args.profile_every)
+        v = estimateCharm(source=corpusPaths(args.input_file, args.glob or ["*.py"]),
+                          language=lexers[args.lexer],
                           results=args.results_file,
                           details=args.details_file,
-                          activate=args.activate
+                          activate=args.activate,
+                          executor=makeExecutor(**executor),
+                          window=args.window,
+                          baselineJobs=args.baseline_jobs,
+                          baselineCacheFile=args.baseline_cache,
+                          memoryLimit=None if args.memory_limit is None else args.memory_limit * 1024 * 1024,
+                          logMutants=args.log_mutants,
+                          profiler=profiler,
+                          matrix=args.matrix_file,
+                          exhaustive=args.exhaustive,
+                          budget=None if args.time_budget is None else charmBudget(args.time_budget),
+                          history=None if args.incremental is None else charmHistory(args.incremental),
+                          **options
                          )
-        v.estimate(REPLACE, args.maximum_error)
+        v.metrics.serve(args.metrics_file, args.metrics_port, args.metrics_interval)
+        if args.coordinator is None:
+          v.estimate(REPLACE, args.maximum_error)
+        else:
+          coordinator = charmCoordinator(v, parseAddress(args.coordinator), abandon=args.abandon)
+          coordinator.start()
+          workers = [Process(target=runWorker, args=(coordinator.address, executor, args.activate, lexers[args.lexer], options))
+                     for i in range(0, args.workers)]
+          for worker in workers:
+            worker.start()
+          try:
+            coordinator.estimate(REPLACE, args.maximum_error)
+          finally:
+            coordinator.release()
+            for worker in workers:
+              worker.join()
+        if v.history is not None:
+          info("%i input files unchanged, %i carried over from earlier results" % (v.history.unchanged, v.history.changed))
         v.release()
 
 if __name__ == '__main__':
@@ -0,0 +1,276 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The part of running a mutant that happens in the child. It imports as
+little as possible, since executors that start fresh interpreters pay
+for every import on every mutant.
+"""
+
+from logging import debug
+import os, sys, traceback, runpy, json
+
+def applyActivation(state):
+    """Put a worker into the state captured by activationState()."""
+    if state is None:
+      return
+    sys.path[:] = state['path']
+    sys.prefix = state['prefix']
+    sys.exec_prefix = state['exec_prefix']
+    if state['real_prefix'] is not None:
+      sys.real_prefix = state['real_prefix']
+    os.environ.update(state['environ'])
+
+class ResourceLimitError(Exception):
+    """A mutant ran into one of the resource limits it was run under."""
+    # The same name even when this module runs as __main__ in a child.
+    __module__ = "estimatecharm.mutantChild"
+
+# The limits a mutant can be run under, as resource module names.
+limitNames = dict(memory='RLIMIT_AS', cpu='RLIMIT_CPU', processes='RLIMIT_NPROC')
+
+def applyLimits(limits):
+    """
+    Put this process in a process group of its own, so it can be killed
+    along with anything it starts, then apply limits: a dict that may give
+    memory (bytes of address space), cpu (seconds) and processes (for the
+    user, as RLIMIT_NPROC counts them). Only soft limits are lowered.
+    """
+    try:
+      os.setpgid(0, 0)
+    except OSError:
+      pass
+    if not limits:
+      return
+    import resource
+    for (name, value) in limits.items():
+      if value is None:
+        continue
+      which = getattr(resource, limitNames[name])
+      (soft, hard) = resource.getrlimit(which)
+      if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+      resource.setrlimit(which, (value, hard))
+
+class outputRing(object):
+    """A file-like sink that keeps only the last size characters written."""
+
+    def __init__(self, size):
+        self.size = size
+        self.text = ""
+
+    def write(self, s):
+        self.text = self.text + s
+        if len(self.text) > 2 * self.size:
+          self.text = self.text[-self.size:]
+        return len(s)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return self.text[-self.size:]
+
+def redirectOutput(output="discard", descriptors=True):
+    """
+    Point stdout and stderr at /dev/null, unless output is "inherit". If
+    output is a number, what python code writes to sys.stdout and
+    sys.stderr is kept in an outputRing of that size, which is returned.
+    A subinterpreter shares descriptors 1 and 2 with the whole process, so
+    it passes descriptors=False and only sys.stdout and sys.stderr move.
+    """
+    if output == "inherit":
+      return None
+    if descriptors:
+      null = os.open(os.devnull, os.O_WRONLY)
+      os.dup2(null, 1)
+      os.dup2(null, 2)
+      os.close(null)
+    if output == "discard":
+      sys.stdout = sys.stderr = open(os.devnull, 'w')
+      return None
+    sys.stdout = sys.stderr = outputRing(int(output))
+    return sys.stdout
+
+def capturedResult(r, ring):
+    """Add what ring caught to a result, as an extra last field."""
+    if ring is None:
+      return r
+    return tuple(r[0:3]) + (ring.getvalue(),)
+
+def limitedResult(r, limits):
+    """Report running out of memory under a memory limit as hitting it."""
+    if limits and limits.get('memory') is not None and r[0] is MemoryError:
+      return (ResourceLimitError, "Memory limit: %s" % (r[1]),) + tuple(r[2:])
+    return r
+
+def executeFile(path):
+    """Run a python file, returning (exception type, message, traceback)."""
+    try:
+        runpy.run_path(path)
+    except SyntaxError as se:
+        ei = sys.exc_info();
+        eip = (ei[0], str(ei[1]), traceback.extract_tb(ei[2]))
+        try:
+          eip[2].append(ei[1][1])
+        except (IndexError, TypeError): # Python 3 exceptions aren't indexable
+          eip[2].append((se.filename, se.lineno, None, None))
+        return eip
+    except Exception as e:
+        ei = sys.exc_info();
+        debug("run_path exception:", exc_info=ei)
+        eip = (ei[0], str(ei[1]), traceback.extract_tb(ei[2]))
+        return eip
+    return (None, "None", [(path, None, None, None)])
+
+def packResult(r):
+    """
+    Make a result safe to pickle or send as JSON. Exception classes defined
+    by the file itself can't be unpickled by the parent, so classes travel
+    by name and traceback frames travel as plain tuples.
+    """
+    if r[0] is None:
+      exc = None
+    else:
+      exc = (r[0].__module__, r[0].__name__)
+    return (exc, r[1], [tuple(frame) for frame in r[2]]) + tuple(r[3:])
+
+def compactResult(r, path):
+    """
+    Cut a result down to what estimation uses: the innermost traceback
+    frame in the file that was run, and the start of the message.
+    """
+    frames = [frame for frame in r[2] if frame[0] == path]
+    return (r[0], str(r[1])[:256], frames[-1:]) + tuple(r[3:])
+
+def matching(a, b, n, same):
+    """The largest k <= n for which same(a, b, k), by bisection, since
+    comparing slices is much faster than stepping through characters."""
+    (low, high) = (0, n)
+    while low < high:
+      mid = (low + high + 1) // 2
+      if same(a, b, mid):
+        low = mid
+      else:
+        high = mid - 1
+    return low
+
+def sourceEdit(base, source):
+    """
+    Describe source as one edit of base: (offset, deleted length, inserted
+    text), spanning everything between their common prefix and suffix.
+    """
+    n = min(len(base), len(source))
+    start = matching(base, source, n, lambda a, b, k: a[:k] == b[:k])
+    end = matching(base, source, n - start,
+                   lambda a, b, k: a[len(a)-k:] == b[len(b)-k:])
+    return (start, len(base) - start - end, source[start:len(source)-end])
+
+def applyEdit(base, edit):
+    """Rebuild the source an edit from sourceEdit() describes."""
+    (offset, deleted, inserted) = edit
+    return base[:offset] + inserted + base[offset+deleted:]
+
+class Overtime(BaseException):
+    """
+    Raised in a mutant that runs past its deadline. Not an Exception, so
+    the mutant's own except Exception clauses let it through.
+    """
+
+def watchDeadline(seconds):
+    """
+    Raise Overtime in any python code running once seconds have passed,
+    checked at each function start and jump sys.monitoring reports. This
+    is how a subinterpreter, which can't be killed, stops a mutant that
+    doesn't halt; code blocked in C isn't stopped.
+    """
+    import time
+    clock = time.monotonic
+    deadline = clock() + seconds
+    monitoring = sys.monitoring
+    def check(code, *offsets):
+      if code.co_filename == __file__:
+        # Not here, where the mutant is reported on.
+        return monitoring.DISABLE
+      if clock() > deadline:
+        raise Overtime()
+    events = monitoring.events.PY_START | monitoring.events.JUMP
+    monitoring.use_tool_id(monitoring.PROFILER_ID, "estimatecharm")
+    monitoring.register_callback(monitoring.PROFILER_ID, monitoring.events.PY_START, check)
+    monitoring.register_callback(monitoring.PROFILER_ID, monitoring.events.JUMP, check)
+    monitoring.set_events(monitoring.PROFILER_ID, events)
+
+def runInterpreted(path, activation, output, seconds):
+    """
+    Run path in the subinterpreter this is called in, returning its packed
+    result as JSON, a str any interpreter can take. activation is JSON as
+    main() takes it. A mutant still running after seconds didn't halt.
+    """
+    applyActivation(None if activation is None else json.loads(activation))
+    ring = redirectOutput(output, False)
+    watchDeadline(seconds)
+    try:
+      r = packResult(executeFile(path))
+    except Overtime:
+      r = (("estimatecharm.mutantExecutor", "HaltingError"), "Didn't halt.",
+           [(path, None, None, None)])
+    finally:
+      sys.monitoring.set_events(sys.monitoring.PROFILER_ID, 0)
+      sys.monitoring.free_tool_id(sys.monitoring.PROFILER_ID)
+    return json.dumps(capturedResult(r, ring))
+
+def unsafeModules(names):
+    """
+    The modules among names that won't import in the interpreter this is
+    called in: extension modules that don't support subinterpreters, or
+    packages that import one. Only extension modules are imported.
+    """
+    from importlib.util import find_spec
+    from importlib.machinery import EXTENSION_SUFFIXES
+    unsafe = []
+    for name in names:
+      if name == '__main__':
+        continue
+      try:
+        spec = find_spec(name)
+        if spec is None or spec.origin is None:
+          continue
+        if spec.origin.endswith(tuple(EXTENSION_SUFFIXES)):
+          __import__(name)
+      except ModuleNotFoundError:
+        continue
+      except ImportError:
+        unsafe.append(name)
+      except Exception:
+        continue
+    return unsafe
+
+def main(argv):
+    """Run argv[2] and write its packed result as JSON to descriptor argv[1]."""
+    (fd, path) = (int(argv[1]), argv[2])
+    activation = os.environ.pop("ESTIMATECHARM_ACTIVATION", None)
+    limits = json.loads(os.environ.pop("ESTIMATECHARM_LIMITS", "null"))
+    output = json.loads(os.environ.pop("ESTIMATECHARM_OUTPUT", '"discard"'))
+    applyActivation(None if activation is None else json.loads(activation))
+    applyLimits(limits)
+    ring = redirectOutput(output)
+    r = packResult(capturedResult(limitedResult(executeFile(path), limits), ring))
+    with os.fdopen(fd, 'w') as f:
+      json.dump(r, f)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,705 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Ways of running a python file in isolation and reporting how it died."""
+
+from logging import debug, info, warning, error
+import os, sys, select, signal, shutil, time, struct, threading
+from itertools import islice
+from tempfile import mkstemp, mkdtemp
+
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+
+from estimatecharm.mutantChild import applyActivation, executeFile, packResult, compactResult
+from estimatecharm.mutantChild import sourceEdit, applyEdit
+from estimatecharm.mutantChild import ResourceLimitError, applyLimits, limitedResult
+from estimatecharm.mutantChild import redirectOutput, capturedResult
+from estimatecharm.charmCoverage import lineTracer
+
+from multiprocessing import Process, Queue, Pipe
+try:
+  from multiprocessing.connection import wait
+except ImportError:
+  # Python 2 has no wait() or Process.sentinel: runChild polls the pipe.
+  wait = None
+try:
+  from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+  shared_memory = None
+try:
+  from Queue import Empty, Full
+  from Queue import Queue as threadQueue
+except ImportError:
+  from queue import Empty, Full
+  from queue import Queue as threadQueue
+
+class HaltingError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+def didntHalt(path):
+    return (HaltingError, "Didn't halt.", [(path, None, None, None)])
+
+def diedResult(path, signum, limits=None):
+    """
+    The result for a child killed by signal signum before it said how it
+    ended. Under limits, being killed for using too much CPU, or crashing
+    under a memory limit, is hitting a limit. Anything else didn't halt, as
+    the old Queue based runner reported it.
+    """
+    if limits:
+      if limits.get('cpu') is not None and signum in (signal.SIGXCPU, signal.SIGKILL):
+        return (ResourceLimitError, "CPU limit.", [(path, None, None, None)])
+      if limits.get('memory') is not None and signum in (signal.SIGSEGV, signal.SIGBUS, signal.SIGABRT):
+        return (ResourceLimitError, "Memory limit.", [(path, None, None, None)])
+    return didntHalt(path)
+
+def killGroup(pid):
+    """Kill a child's process group, taking anything it started with it."""
+    try:
+      os.killpg(pid, signal.SIGKILL)
+    except OSError:
+      pass
+
+def activateVirtualEnv(activate):
+    if not activate is None:
+      if sys.version_info >= (3,0):
+        exec(compile(open(activate, "rb").read(), activate, 'exec'), dict(__file__=activate))
+      else:
+        execfile(activate, dict(__file__=activate))
+
+def captureActivation(q, activate):
+    environ = dict(os.environ)
+    try:
+      activateVirtualEnv(activate)
+    except Exception as e:
+      q.put("%s: %s" % (type(e).__name__, e))
+      return
+    q.put(dict(
+      path=list(sys.path),
+      prefix=sys.prefix,
+      exec_prefix=sys.exec_prefix,
+      real_prefix=getattr(sys, 'real_prefix', None),
+      environ=dict((k, v) for (k, v) in os.environ.items() if environ.get(k) != v)
+      ))
+
+def activationState(activate):
+    """
+    Run a virtualenv activate_this.py once, in a throwaway process, and
+    capture the sys.path, sys.prefix and environment it leaves behind.
+    """
+    if activate is None:
+      return None
+    q = Queue()
+    p = Process(target=captureActivation, args=(q,activate,))
+    p.start()
+    try:
+      state = q.get(True, 60)
+    except Empty as e:
+      state = "it didn't finish."
+    p.terminate()
+    p.join()
+    if not isinstance(state, dict):
+      raise RuntimeError("Couldn't activate %s because %s" % (activate, state))
+    return state
+
+def runFile(conn, path, reportModules=False, activation=None, limits=None, output="discard"):
+    applyLimits(limits)
+    applyActivation(activation)
+    ring = redirectOutput(output)
+    if reportModules:
+      before = set(sys.modules)
+      tracer = lineTracer(path)
+      tracer.start()
+    r = capturedResult(limitedResult(executeFile(path), limits), ring)
+    if reportModules:
+      executed = tracer.stop()
+      conn.send((r, sorted(set(sys.modules) - before), executed))
+    else:
+      conn.send(r)
+
+def exceptionClass(module, name):
+    """Find the exception class named in a packed result."""
+    if module == HaltingError.__module__ and name == HaltingError.__name__:
+      return HaltingError
+    try:
+      cls = getattr(sys.modules[module], name)
+      if isinstance(cls, type):
+        return cls
+    except (KeyError, AttributeError):
+      pass
+    return type(name, (Exception,), dict(__module__=module))
+
+def unpackResult(r):
+    if r[0] is None:
+      exc = None
+    else:
+      exc = exceptionClass(*r[0])
+    return (exc, r[1], [tuple(frame) for frame in r[2]]) + tuple(r[3:])
+
+def takeOutput(r, path):
+    """Log and drop the output a child captured along with its result."""
+    if len(r) > 3:
+      debug("Output of %s:\n%s" % (path, r[3]))
+      return r[0:3]
+    return r
+
+def ahead(items, size):
+    """
+    Iterate over items on a thread of their own, which keeps up to size of
+    them made ahead in a queue and waits while it's full. Making them only
+    overlaps with what doesn't hold the GIL, like waiting for a child, and
+    anything forked meanwhile is forked mid-way through it. An exception
+    making them is raised here instead. Closing this stops the thread.
+    """
+    made = threadQueue(size)
+    stop = threading.Event()
+    def put(entry):
+        while not stop.is_set():
+          try:
+            made.put(entry, timeout=0.1)
+            return True
+          except Full:
+            pass
+        return False
+    def produce():
+        try:
+          for item in items:
+            if not put((True, item)):
+              return
+        except BaseException as e:
+          put((False, e))
+          return
+        put((False, None))
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+      while True:
+        (more, item) = made.get()
+        if not more:
+          if item is not None:
+            raise item
+          return
+        yield item
+    finally:
+      stop.set()
+      thread.join()
+
+def writeAll(fd, source):
+    data = source.encode('utf-8')
+    while data:
+      data = data[os.write(fd, data):]
+
+class tempFileStore(object):
+    """Mutants as ordinary temporary files in a directory."""
+
+    def __init__(self, tempDir="."):
+        self.tempDir = tempDir
+
+    def write(self, source):
+        """Put source somewhere and return a path it can be run from."""
+        (fd, path) = mkstemp(suffix=".py", prefix="mutant", dir=self.tempDir)
+        writeAll(fd, source)
+        os.close(fd)
+        return path
+
+    def reserve(self):
+        """An empty path for some other process to write a mutant to."""
+        return self.write("")
+
+    def remove(self, path):
+        os.remove(path)
+
+    def release(self):
+        pass
+
+class tmpfsStore(tempFileStore):
+    """Mutants as files in a private directory on a memory backed tmpfs."""
+
+    def __init__(self, tmpfs="/dev/shm"):
+        super(tmpfsStore, self).__init__(mkdtemp(prefix="estimatecharm", dir=tmpfs))
+
+    def release(self):
+        shutil.rmtree(self.tempDir, True)
+
+class memfdStore(object):
+    """
+    Mutants as anonymous memfd_create files, reached through
+    /proc/<pid>/fd/<fd>. The pid is explicit rather than self so the path
+    also works from processes that didn't inherit the descriptor, like the
+    zygote's children.
+    """
+
+    def __init__(self):
+        self.fds = dict()
+
+    def write(self, source):
+        fd = os.memfd_create("mutant.py")
+        writeAll(fd, source)
+        path = "/proc/%i/fd/%i" % (os.getpid(), fd)
+        self.fds[path] = fd
+        return path
+
+    def reserve(self):
+        return self.write("")
+
+    def remove(self, path):
+        os.close(self.fds.pop(path))
+
+    def release(self):
+        for fd in self.fds.values():
+          os.close(fd)
+        self.fds = dict()
+
+mutantStores = ["file", "tmpfs", "memfd"]
+
+def openMutantStore(kind="file", tempDir="."):
+    """Make a mutant store, falling back to plain files where unsupported."""
+    if kind == "memfd":
+      if hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd"):
+        return memfdStore()
+      warning("memfd_create isn't available here, trying tmpfs.")
+      kind = "tmpfs"
+    if kind == "tmpfs":
+      if os.path.isdir("/dev/shm"):
+        return tmpfsStore()
+      warning("No tmpfs at /dev/shm, using %s." % (tempDir))
+      kind = "file"
+    if kind == "file":
+      return tempFileStore(tempDir)
+    raise ValueError("Unknown mutant store: %s" % (kind))
+
+class processExecutor(object):
+    """
+    Run every file in a fresh child process, as we always have. Each child
+    gets a process group of its own, killed as a whole once the child is
+    done, and mutants run under limits, a dict as applyLimits() takes.
+    Children's output is discarded, inherited or, if output is a number,
+    that much of the end of it is logged, as redirectOutput() takes it.
+    """
+
+    def __init__(self, timeout=10, activate=None, store=None, limits=None,
+                 output="discard"):
+        self.timeout = timeout
+        self.limits = limits
+        self.output = output
+        self.activate = activate
+        self.activation = None
+        self.store = tempFileStore() if store is None else store
+        self.failures = 0
+
+    def start(self):
+        """Per-worker initialisation: activate the virtualenv, if any."""
+        self.activation = activationState(self.activate)
+
+    def baseline(self, path):
+        """
+        Run an unmutated file, returning the result, the modules it loaded
+        and the lines of it that ran.
+        """
+        output = "inherit" if self.output == "inherit" else "discard"
+        (reported, r) = self.runChild(path, True, None, output)
+        if reported is None:
+          return (r, [], None)
+        return reported
+
+    def runChild(self, path, reportModules=False, limits=None, output="discard"):
+        """
+        Run path with runFile in a child process, returning what it reported
+        and None, or None and the result to give instead if it didn't report.
+        A child that dies early is noticed then, not at the timeout.
+        """
+        (conn, childConn) = Pipe(False)
+        p = Process(target=runFile, args=(childConn,path,reportModules,self.activation,limits,output))
+        p.start()
+        childConn.close()
+        try:
+          os.setpgid(p.pid, p.pid)
+        except OSError:
+          pass
+        reported = None
+        if wait is not None:
+          timedOut = len(wait([conn, p.sentinel], self.timeout)) == 0
+        else:
+          # The child's end closing when it exits wakes this too, unless
+          # something it started still holds it.
+          timedOut = not conn.poll(self.timeout)
+        if not timedOut and conn.poll():
+          try:
+            reported = conn.recv()
+          except EOFError:
+            pass
+        killGroup(p.pid)
+        if p.is_alive():
+          p.terminate()
+        p.join()
+        conn.close()
+        assert not p.is_alive()
+        if reported is not None:
+          return (reported, None)
+        if timedOut or p.exitcode >= 0:
+          return (None, didntHalt(path))
+        return (None, diedResult(path, -p.exitcode, limits))
+
+    def baselineSource(self, source):
+        """Like baseline(), for source that isn't in a file: it runs from the store."""
+        path = self.store.write(source)
+        try:
+          return self.baseline(path)
+        finally:
+          self.store.remove(path)
+
+    def run(self, path, preload=()):
+        (reported, r) = self.runChild(path, False, self.limits, self.output)
+        #assert r[2][-1][2] != "_get_code_from_file" # This seems to be legit
+        return r if reported is None else takeOutput(reported, path)
+
+    def runBatch(self, paths, preload=()):
+        """Run several files, returning their results in order."""
+        return [self.run(path, preload) for path in paths]
+
+    def runMutant(self, source, preload=()):
+        """Run mutant source, returning the path it ran as and the result."""
+        path = self.store.write(source)
+        try:
+          return (path, self.run(path, preload))
+        finally:
+          self.store.remove(path)
+
+    def stream(self, mutants, preload=()):
+        """
+        Run (source, tag) pairs from the iterable mutants, yielding
+        (tag, path, result) as each one finishes. This one runs them one
+        at a time.
+        """
+        for (source, tag) in mutants:
+          (path, r) = self.runMutant(source, preload)
+          yield (tag, path, r)
+
+    def streamEdits(self, base, edits, preload=()):
+        """
+        Like stream(), but for (edit, tag) pairs, each edit being a
+        sourceEdit() of base. This one rebuilds every mutant itself.
+        """
+        mutants = ((applyEdit(base, edit), tag) for (edit, tag) in edits)
+        return self.stream(mutants, preload)
+
+    def release(self):
+        self.store.release()
+
+def preloadModules(modules):
+    for module in modules:
+      if module in sys.modules or module == '__main__':
+        continue
+      try:
+        __import__(module)
+      except BaseException as e:
+        debug("Zygote couldn't preload %s: %s" % (module, e))
+
+class sharedSource(object):
+    """
+    A file's source, put once in shared memory so processes that make its
+    mutants only need to be sent edits. Where shared memory isn't
+    available the source travels inline instead.
+    """
+
+    def __init__(self, source):
+        data = source.encode('utf-8')
+        self.memory = None
+        if shared_memory is None:
+          self.key = ('inline', source)
+          return
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        self.memory.buf[:len(data)] = data
+        self.key = ('shm', self.memory.name, len(data), trackerPid())
+
+    def release(self):
+        if self.memory is not None:
+          self.memory.close()
+          self.memory.unlink()
+          self.memory = None
+
+def trackerPid():
+    """The pid of the resource tracker this process registers shared memory with, if known."""
+    return getattr(resource_tracker._resource_tracker, '_pid', None)
+
+def attachSource(key):
+    """Read back the source a sharedSource key refers to."""
+    if key[0] == 'inline':
+      return key[1]
+    (kind, name, size, tracker) = key
+    try:
+      memory = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+      # Before 3.13 attaching also registers the block with this process's
+      # resource tracker, which would unlink it when this process exits.
+      # If that's the creator's tracker too, as in a process forked after
+      # it started, unregistering would cancel the creator's registration.
+      memory = shared_memory.SharedMemory(name=name)
+      if tracker is None or trackerPid() != tracker:
+        resource_tracker.unregister(memory._name, "shared_memory")
+    try:
+      return bytes(memory.buf[:size]).decode('utf-8')
+    finally:
+      memory.close()
+
+def writeSource(path, source):
+    fd = os.open(path, os.O_WRONLY | os.O_TRUNC)
+    try:
+      writeAll(fd, source)
+    finally:
+      os.close(fd)
+
+def forkFile(path, timeout, base=None, edit=None, limits=None, output="discard"):
+    """
+    Fork a copy of this process to run a file, in a process group of its
+    own, under limits and with its output redirected as output says. If
+    edit is given, the child first writes the mutant it describes to
+    path. The result comes back prefixed with its length, so anything the
+    child started that still holds the pipe open can't keep it waiting.
+    """
+    (readEnd, writeEnd) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+      try:
+        os.close(readEnd)
+        applyLimits(limits)
+        ring = redirectOutput(output)
+        if edit is not None:
+          writeSource(path, applyEdit(base, edit))
+        r = capturedResult(limitedResult(executeFile(path), limits), ring)
+        data = pickle.dumps(packResult(compactResult(r, path)), 2)
+        data = struct.pack(">Q", len(data)) + data
+        while data:
+          data = data[os.write(writeEnd, data):]
+      finally:
+        os._exit(0)
+    os.close(writeEnd)
+    try:
+      os.setpgid(pid, pid)
+    except OSError:
+      pass
+    data = b""
+    size = None
+    halted = True
+    while size is None or len(data) < size:
+      (ready, _, _) = select.select([readEnd], [], [], timeout)
+      if not ready:
+        halted = False
+        break
+      chunk = os.read(readEnd, 65536)
+      if not chunk:
+        break
+      data = data + chunk
+      if size is None and len(data) >= 8:
+        size = struct.unpack(">Q", data[:8])[0] + 8
+    os.close(readEnd)
+    killGroup(pid)
+    (_, status) = os.waitpid(pid, 0)
+    if halted and size is not None and len(data) >= size:
+      return pickle.loads(data[8:size])
+    if halted and os.WIFSIGNALED(status):
+      return packResult(diedResult(path, os.WTERMSIG(status), limits))
+    # It either looped forever or left without saying why (sys.exit,
+    # os._exit, a crash...): the old Queue based runner reported both
+    # as not halting.
+    return packResult(didntHalt(path))
+
+def zygote(conn, activation, output="discard"):
+    """
+    Warm process: activate the virtualenv and import everything the target
+    files need once, then fork a copy-on-write child for every file. Jobs
+    are (path, edit) pairs; an edit applies to the source named by the
+    batch's sharedSource key, which is read once and kept until the next
+    file's arrives. The modules to preload only come when they change.
+    """
+    applyActivation(activation)
+    if output != "inherit":
+      # Anything the preloaded modules print goes nowhere, as a mutant's does.
+      redirectOutput("discard")
+    (sourceKey, base) = (None, None)
+    while True:
+      try:
+        (jobs, preload, timeout, key, limits) = conn.recv()
+      except (EOFError, KeyboardInterrupt):
+        break
+      if preload is not None:
+        preloadModules(preload)
+      if key is not None and key != sourceKey:
+        (sourceKey, base) = (key, attachSource(key))
+      startTime = time.time()
+      results = [forkFile(path, timeout, base, edit, limits, output) for (path, edit) in jobs]
+      conn.send((results, time.time() - startTime))
+    conn.close()
+
+class zygoteExecutor(processExecutor):
+    """
+    Run every file in a child forked from a warm zygote process. Mutants go
+    to the zygote in batches, sized so a batch takes about batchTime
+    seconds, and come back as compact results.
+    """
+
+    def __init__(self, timeout=10, activate=None, store=None, limits=None,
+                 output="discard", batchTime=0.05, maxBatch=256):
+        super(zygoteExecutor, self).__init__(timeout, activate, store, limits, output)
+        self.process = None
+        self.conn = None
+        self.batchTime = batchTime
+        self.maxBatch = maxBatch
+        self.batchSize = 1
+        self.shared = None
+        self.sharedBase = None
+        # The modules the running zygote was last told to preload.
+        self.preloaded = None
+
+    def start(self):
+        if self.activation is None:
+          super(zygoteExecutor, self).start()
+        self.spawn()
+
+    def spawn(self):
+        (self.conn, childConn) = Pipe()
+        self.process = Process(target=zygote, args=(childConn, self.activation, self.output))
+        self.process.daemon = True
+        self.process.start()
+        childConn.close()
+        self.preloaded = None
+
+    def send(self, paths, preload=(), edits=None):
+        if self.process is None or not self.process.is_alive():
+          self.spawn()
+        if edits is None:
+          (jobs, key) = ([(path, None) for path in paths], None)
+        else:
+          (jobs, key) = (list(zip(paths, edits)), self.shared.key)
+        preload = list(preload)
+        try:
+          self.conn.send((jobs, None if preload == self.preloaded else preload,
+                          self.timeout, key, self.limits))
+          self.preloaded = preload
+          return True
+        except (IOError, OSError):
+          return False
+
+    def receive(self, paths):
+        try:
+          (results, elapsed) = self.conn.recv()
+        except (EOFError, IOError, OSError):
+          warning("Zygote died, restarting it.")
+          self.failures = self.failures + 1
+          self.stop()
+          return [didntHalt(path) for path in paths]
+        self.adapt(len(paths), elapsed)
+        return [takeOutput(unpackResult(r), path) for (r, path) in zip(results, paths)]
+
+    def adapt(self, n, elapsed):
+        """Size the next batch from how long this one took per mutant."""
+        perMutant = elapsed / n
+        if perMutant <= 0:
+          self.batchSize = self.maxBatch
+        else:
+          self.batchSize = int(self.batchTime / perMutant)
+        self.batchSize = max(1, min(self.maxBatch, self.batchSize))
+
+    def runBatch(self, paths, preload=()):
+        if not self.send(paths, preload):
+          return [didntHalt(path) for path in paths]
+        return self.receive(paths)
+
+    def run(self, path, preload=()):
+        return self.runBatch([path], preload)[0]
+
+    def nextBatch(self, mutants, edits):
+        """Take the next batch as (tag, path, edit) triples."""
+        batch = list()
+        for (mutant, tag) in islice(mutants, self.batchSize):
+          if edits:
+            batch.append((tag, self.store.reserve(), mutant))
+          else:
+            batch.append((tag, self.store.write(mutant), None))
+        return batch
+
+    def stream(self, mutants, preload=(), edits=False):
+        """
+        Run mutants in batches. The next batch is made and written while
+        the zygote is busy with the current one. If the stream is closed
+        early, mutants made but not yet yielded are dropped.
+        """
+        mutants = iter(mutants)
+        batch = self.nextBatch(mutants, edits)
+        upcoming = list()
+        try:
+          while len(batch) > 0:
+            paths = [path for (tag, path, edit) in batch]
+            if edits:
+              sent = self.send(paths, preload, [edit for (tag, path, edit) in batch])
+            else:
+              sent = self.send(paths, preload)
+            upcoming = self.nextBatch(mutants, edits)
+            if sent:
+              results = self.receive(paths)
+            else:
+              results = [didntHalt(path) for path in paths]
+            for r in results:
+              (tag, path, edit) = batch.pop(0)
+              self.store.remove(path)
+              yield (tag, path, r)
+            (batch, upcoming) = (upcoming, list())
+        finally:
+          for (tag, path, edit) in batch + upcoming:
+            self.store.remove(path)
+
+    def share(self, base):
+        """Put base in shared memory, unless it's there already."""
+        if self.shared is not None and self.sharedBase is base:
+          return
+        self.unshare()
+        self.shared = sharedSource(base)
+        self.sharedBase = base
+
+    def unshare(self):
+        if self.shared is not None:
+          self.shared.release()
+        self.shared = None
+        self.sharedBase = None
+
+    def streamEdits(self, base, edits, preload=()):
+        """Send the zygote only edits; its children rebuild the mutants."""
+        self.share(base)
+        return self.stream(edits, preload, True)
+
+    def release(self):
+        self.stop()
+        self.unshare()
+        super(zygoteExecutor, self).release()
+
+    def stop(self):
+        if self.conn is not None:
+          self.conn.close()
+          self.conn = None
+        if self.process is not None:
+          self.process.join(1)
+          if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+          self.process = None
@@ -22,7 +22,7 @@ from logging import debug, info, warning, error
 from estimatecharm import flexibleTokenize
 import re
 
-import sys, token
+import sys, token, tokenize
 try:
   from cStringIO import StringIO
 except ImportError:
@@ -78,24 +78,32 @@ class pythonSource(ucSource):
         return [pythonLexeme.fromTuple(t) for t in tokGen]
     
     def deLex(self):
-        line = 1
-        col = 0
-        src = ""
-        for l in self:
-            for i in range(line, l.start.line):
-                src += os.linesep
+        return "".join(text for (text, at) in self.layout())
+    
+    def layout(self, start=0, at=(1, 0)):
+        """
+        Lay out the lexemes from start on as deLex() does, beginning at the
+        (line, column) at, yielding the text each adds, whitespace before it
+        included, and the (line, column) it leaves off at.
+        """
+        (line, col) = at
+        for i in range(start, len(self)):
+            l = self[i]
+            text = ""
+            if line < l.start.line:
+                text = os.linesep * (l.start.line - line)
+                line = l.start.line
                 col = 0
-                line += 1
-            for i in range(col, l.start.col):
-                src += " "
-                col += 1
-            src += l.val
+            if col < l.start.col:
+                text += " " * (l.start.col - col)
+                col = l.start.col
+            text += l.val
             col += len(l.val)
             nls = l.val.count(os.linesep)
             if (nls > 0):
                 line += nls
                 col = len(l.val.splitlines().pop())
-        return src
+            yield (text, (line, col))
     
     def unCommented(self):
         assert len(self)
@@ -119,4 +127,53 @@ class pythonSource(ucSource):
             else:
                 r.append(ls[i])
         assert len(r)
-        return pythonSource(r)
\ No newline at end of file
+        return self.__class__(r)
+
+def stdlibTokens(code):
+    """
+    Tokens of code from the interpreter's own tokenizer, with each f-string
+    as one STRING token like older tokenizers give, so its text stays whole.
+    """
+    lines = StringIO(code).readlines()
+    def text(start, end):
+        if start[0] == end[0]:
+            return lines[start[0]-1][start[1]:end[1]]
+        return (lines[start[0]-1][start[1]:]
+                + "".join(lines[start[0]:end[0]-1])
+                + lines[end[0]-1][:end[1]])
+    fstringStart = getattr(tokenize, 'FSTRING_START', None)
+    fstringEnd = getattr(tokenize, 'FSTRING_END', None)
+    depth = 0
+    for t in tokenize.generate_tokens(StringIO(code).readline):
+        if t[0] == fstringStart:
+            if depth == 0:
+                start = t[2]
+            depth += 1
+        elif t[0] == fstringEnd:
+            depth -= 1
+            if depth == 0:
+                yield (token.STRING, text(start, t[3]), start, t[3])
+        elif depth == 0:
+            yield (t[0], t[1], t[2], t[3])
+
+class stdlibPythonSource(pythonSource):
+    """
+    Python source lexed by the stdlib tokenize module, which knows current
+    syntax and is much faster on CPythons that back it with the C tokenizer.
+    Code it rejects, like many mutants, and mid_line excerpts are lexed by
+    flexibleTokenize instead.
+    """
+    
+    def lex(self, code, mid_line=False):
+        if not mid_line:
+            try:
+                return [pythonLexeme.fromTuple((tokenize.tok_name[t[0]],) + t[1:])
+                        for t in stdlibTokens(code)]
+            except (tokenize.TokenError, SyntaxError):
+                pass
+        return super(stdlibPythonSource, self).lex(code, mid_line)
+
+lexers = {
+  "flexible": pythonSource,
+  "stdlib": stdlibPythonSource,
+}
@@ -0,0 +1,176 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+An executor that runs mutants in subinterpreters, kept apart from
+mutantExecutor since it needs concurrent.interpreters, new in Python 3.14.
+"""
+
+from logging import debug, info, warning, error
+import sys, json, threading
+from concurrent import interpreters
+from concurrent.futures import (Future, ThreadPoolExecutor, wait,
+                                FIRST_COMPLETED, TimeoutError)
+
+from estimatecharm.mutantExecutor import *
+
+# Run in a fresh subinterpreter, with searchPath and results set by
+# prepare_main(), along with the arguments of the function each calls.
+runner = """
+import sys, json
+sys.path[:] = json.loads(searchPath)
+from estimatecharm.mutantChild import runInterpreted
+results.put(runInterpreted(path, activation, output, seconds))
+"""
+prober = """
+import sys, json
+sys.path[:] = json.loads(searchPath)
+from estimatecharm.mutantChild import unsafeModules
+results.put(json.dumps(unsafeModules(json.loads(names))))
+"""
+
+# Seconds past the timeout to wait for a subinterpreter before giving up
+# on it: one blocked in C, or catching Overtime, can't be stopped, and is
+# left running on its thread, so after that mutants run in processes.
+grace = 5
+
+class subinterpreterExecutor(processExecutor):
+    """
+    Run mutants in fresh subinterpreters of this process, each with a GIL
+    of its own, up to concurrency at once on threads. That skips starting
+    a process per mutant, but everything a mutant does to the process
+    itself, like forking, changing directory or writing to descriptors
+    1 and 2, isn't isolated, and resource limits can't apply to it alone.
+    So mutants run under limits, or importing an extension module that
+    can't load in a subinterpreter, run in processes as processExecutor
+    runs them, and so do baselines. Once any subinterpreter has had to be
+    abandoned, still running, every mutant after it runs in a process, so
+    no more of them take up this process's cores.
+    """
+
+    def __init__(self, timeout=10, activate=None, store=None, limits=None,
+                 output="discard", concurrency=8):
+        super(subinterpreterExecutor, self).__init__(timeout, activate, store, limits, output)
+        self.concurrency = concurrency
+        self.verdicts = dict()
+        self.abandoned = 0
+        self.lock = threading.Lock()
+
+    def interpreted(self, code, **shared):
+        """
+        Exec code in a fresh subinterpreter, on a thread of its own, with
+        shared set in its __main__. Returns whether it finished in time and
+        what it put on results, which is None if it failed.
+        """
+        done = Future()
+        def target():
+          r = None
+          try:
+            results = interpreters.create_queue()
+            interp = interpreters.create()
+            try:
+              interp.prepare_main(results=results, searchPath=json.dumps(sys.path), **shared)
+              interp.exec(code)
+              # Taken before close(), which would unbind it.
+              r = results.get_nowait()
+            finally:
+              interp.close()
+          except Exception as e:
+            debug("Subinterpreter failed: %s" % (e,))
+          finally:
+            done.set_result(r)
+        threading.Thread(target=target, daemon=True).start()
+        try:
+          return (True, done.result(self.timeout + grace))
+        except TimeoutError:
+          with self.lock:
+            self.abandoned = self.abandoned + 1
+          warning("Abandoned a subinterpreter that didn't stop, running mutants in processes from now on.")
+          return (False, None)
+
+    def interpretable(self, preload):
+        """
+        Whether mutants that import the modules preload can run in a
+        subinterpreter, which is decided once for each set of modules, and
+        is no for all of them once a subinterpreter has been abandoned.
+        """
+        if self.limits and any(v is not None for v in self.limits.values()):
+          return False
+        key = frozenset(preload)
+        with self.lock:
+          if self.abandoned > 0:
+            return False
+          if key in self.verdicts:
+            return self.verdicts[key]
+        (finished, r) = self.interpreted(prober, names=json.dumps(sorted(key)))
+        unsafe = None if r is None else json.loads(r)
+        if unsafe is None:
+          warning("Couldn't try imports in a subinterpreter, running mutants in processes.")
+        elif len(unsafe) > 0:
+          info("Running mutants in processes, since %s can't load in a subinterpreter." % (", ".join(unsafe)))
+        with self.lock:
+          self.verdicts[key] = unsafe == []
+        return unsafe == []
+
+    def run(self, path, preload=()):
+        if not self.interpretable(preload):
+          return super(subinterpreterExecutor, self).run(path, preload)
+        activation = None if self.activation is None else json.dumps(self.activation)
+        (finished, r) = self.interpreted(runner, path=path, activation=activation,
+                                         output=self.output, seconds=float(self.timeout))
+        if not finished:
+          return didntHalt(path)
+        if r is None:
+          # Ending the subinterpreter, as with sys.exit(), is left to a
+          # process to report the way it always has.
+          return super(subinterpreterExecutor, self).run(path, preload)
+        return takeOutput(unpackResult(json.loads(r)), path)
+
+    def tagged(self, source, tag, preload):
+        (path, r) = self.runMutant(source, preload)
+        return (tag, path, r)
+
+    def stream(self, mutants, preload=()):
+        """
+        Run mutants on up to concurrency threads, yielding them as they
+        finish. If the stream is closed early, the ones not yet started
+        are dropped and the ones running are waited for.
+        """
+        if not self.interpretable(preload):
+          yield from super(subinterpreterExecutor, self).stream(mutants, preload)
+          return
+        mutants = iter(mutants)
+        pool = ThreadPoolExecutor(self.concurrency)
+        running = set()
+        exhausted = False
+        try:
+          while True:
+            while not exhausted and len(running) < self.concurrency:
+              try:
+                (source, tag) = next(mutants)
+              except StopIteration:
+                exhausted = True
+                break
+              running.add(pool.submit(self.tagged, source, tag, preload))
+            if len(running) == 0:
+              return
+            (done, running) = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+              yield future.result()
+        finally:
+          pool.shutdown(wait=True, cancel_futures=True)
@@ -19,6 +19,7 @@ setup(
     entry_points = {
         "console_scripts": [
             "estimatecharm = estimatecharm.estimateCharm:main",
+            "estimatecharm-bench = estimatecharm.charmBench:main",
         ],
     },
     author = "Joshua Charles Campbell",
@@ -0,0 +1,43 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The fixture the charm tests share: a temporary directory holding a small
+Python file to estimate. Not named test*.py, so it isn't collected itself.
+"""
+
+import unittest
+import os, shutil
+from tempfile import mkdtemp
+
+targetSource = "def f(x):\n    return x + 1\n\ny = f(2)\n"
+
+class targetFileCase(unittest.TestCase):
+    """A test case with targetSource written to self.path in self.tempDir."""
+
+    def setUp(self):
+        self.tempDir = mkdtemp()
+        self.path = self.write("target.py")
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+    def write(self, name, source=targetSource):
+        """Write source to name in self.tempDir, returning its path."""
+        path = os.path.join(self.tempDir, name)
+        with open(path, "w") as f:
+            f.write(source)
+        return path
@@ -0,0 +1,49 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.charmApi import *
+
+import os
+from charmTestCase import targetFileCase
+
+class testCharmApi(targetFileCase):
+    def testEstimate(self):
+        cwd = os.getcwd()
+        os.chdir(self.tempDir)
+        try:
+            results = estimate([self.path], {"in memory": "x = 1\ny = x + 1\n", "broken": "raise ValueError\n"}, 0.5)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual([r.path for r in results], [self.path, "in memory"])
+        self.assertEqual(sorted(os.listdir(self.tempDir)), ["target.py"])
+        for r in results:
+            self.assertTrue(r.delta <= 0.5)
+            self.assertEqual(len(r.mutants), r.lines + 2)
+            self.assertEqual(sum(r.mutants), r.mutations)
+            self.assertEqual(sum(r.errors), r.mutations)
+    def testDetails(self):
+        records = list(iterEstimate(sources={"in memory": "x = 1\ny = x + 1\n"}, deltamax=0.5, details=True))
+        result = records.pop()
+        self.assertTrue(isinstance(result, charmResult))
+        self.assertEqual(len(records), result.mutations)
+        for detail in records:
+            self.assertEqual(len(detail), len(detailColumns))
+            self.assertEqual(detail[0], "in memory")
+        self.assertEqual(records[-1][detailColumns.index("mutations")], result.mutations)
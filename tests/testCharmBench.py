@@ -0,0 +1,61 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.charmBench import *
+
+import os, shutil, json
+from tempfile import mkdtemp
+
+class testCharmBench(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = mkdtemp()
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+    def testShapes(self):
+        for shape in sorted(shapes.keys()):
+            paths = writeCorpus(self.tempDir, shape, 2, 30, 7)
+            again = writeCorpus(self.tempDir, shape, 2, 30, 7)
+            sources = list()
+            for path in paths:
+                with open(path) as f:
+                    sources.append(f.read())
+                exec(compile(sources[-1], path, "exec"), {})
+            self.assertTrue(len(sources[0].splitlines()) >= 30)
+            self.assertNotEqual(sources[0], sources[1])
+            self.assertEqual(paths, again)
+    def testRun(self):
+        case = dict(shape="flat", files=2, lines=5, operator="replace",
+                    executor="process", workers=0, exhaustive="off",
+                    deltamax=1.0, timeout=2.0, seed=1)
+        result = run(case)
+        self.assertFalse('error' in result, result.get('error', None))
+        self.assertEqual(result['estimated'], 2)
+        self.assertTrue(result['mutants'] > 0)
+        self.assertTrue(result['mutantsPerSecond'] > 0)
+        self.assertTrue(result['peakRssMiB'] > 0)
+        path = os.path.join(self.tempDir, "bench.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps(dict(result, mutantsPerSecond=result['mutantsPerSecond'] * 2)) + "\n")
+        (ratio, regressed) = compare(result, readResults(path), 0.1)
+        self.assertEqual(ratio, 0.5)
+        self.assertTrue(regressed)
+        (ratio, regressed) = compare(dict(result, seed=2), readResults(path), 0.1)
+        self.assertEqual(ratio, None)
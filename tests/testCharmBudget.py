@@ -0,0 +1,116 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+
+import os, shutil
+from tempfile import mkdtemp
+
+class fakeClock(object):
+    def __init__(self, step=0.0):
+        self.now = 0.0
+        self.step = step
+    def __call__(self):
+        self.now = self.now + self.step
+        return self.now
+
+class testCharmBudget(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = mkdtemp()
+        self.paths = [os.path.join(self.tempDir, name) for name in ("a.py", "b.py")]
+        for (i, p) in enumerate(self.paths):
+            with open(p, "w") as f:
+                f.write("def f(x):\n    return x + %i\n\ny = f(2)\n" % (i))
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+    def testDuration(self):
+        self.assertEqual(duration("90"), 90.0)
+        self.assertEqual(duration("1.5m"), 90.0)
+        self.assertEqual(duration("2h"), 7200.0)
+    def testPlan(self):
+        clock = fakeClock()
+        budget = charmBudget(100, clock=clock)
+        budget.scan([("a", "x = 1\n" * 9), ("b", "y = 1\n" * 9)])
+        budget.reach("a", 10)
+        self.assertEqual(budget.remainingLines(), 10)
+        stats = charmStats("a", 10)
+        budget.start(stats)
+        self.assertFalse(budget.enough(stats))
+        for i in range(0, 10):
+            clock.now = clock.now + 1
+            stats.record(1, 2)
+            budget.recorded()
+        # 90 seconds left at a second a mutant: (90 + 10) / (10 + 10)
+        # mutants per line for both files.
+        self.assertFalse(budget.enough(stats))
+        self.assertEqual(budget.current[3], 50)
+        stats.mutations = 50
+        self.assertTrue(budget.enough(stats))
+        # What's left is all b's once a is done.
+        budget.reach("b", 10)
+        self.assertEqual(budget.allot(charmStats("b", 10), 1000), 90)
+        self.assertEqual(budget.allot(charmStats("b", 10), 60), 60)
+        clock.now = 100
+        self.assertTrue(budget.expired())
+        self.assertTrue(budget.enough(stats))
+    def testDiscount(self):
+        budget = charmBudget(100, clock=fakeClock())
+        # Inputs aren't read when they're listed, so they needn't exist yet.
+        budget.scan([os.path.join(self.tempDir, name) for name in ("a", "b", "c", "d")])
+        self.assertEqual(budget.remainingLines(), 0)
+        budget.reach(os.path.join(self.tempDir, "a"), 10)
+        self.assertEqual(budget.remainingLines(), 3 * 10)
+        for name in ("d", "d", "a"):
+            budget.discount(os.path.join(self.tempDir, name))
+        self.assertEqual(budget.remainingLines(), 2 * 10)
+        budget.reach(os.path.join(self.tempDir, "c"), 4)
+        self.assertEqual(budget.remainingLines(), 0)
+        self.assertEqual(budget.unreached(), 1)
+    def testDuplicatesDiscounted(self):
+        copy = os.path.join(self.tempDir, "c.py")
+        shutil.copyfile(self.paths[0], copy)
+        self.paths.insert(1, copy)
+        (v, written) = self.estimate(charmBudget(1.0, clock=fakeClock(0.05)))
+        self.assertEqual(v.budget.discounted, set([1]))
+        self.assertEqual(written, set(self.paths))
+        self.assertEqual(list(v.stats[copy].progress), list(v.stats[self.paths[0]].progress))
+    def estimate(self, budget):
+        v = estimateCharm(source=self.paths, tempDir=self.tempDir,
+                          results=os.path.join(self.tempDir, "charm.csv"),
+                          exhaustive="off", budget=budget)
+        try:
+            v.estimate(REPLACE, 0.01)
+        finally:
+            v.release()
+        with open(os.path.join(self.tempDir, "charm.csv.new")) as results:
+            rows = list(csv.reader(results))[1:]
+        return (v, set(row[0] for row in rows))
+    def testSpread(self):
+        (v, written) = self.estimate(charmBudget(1.0, clock=fakeClock(0.05)))
+        for p in self.paths:
+            self.assertTrue(v.stats[p].mutations > 0)
+            self.assertTrue(v.stats[p].needed(0.01) > 0)
+        self.assertEqual(written, set(self.paths))
+    def testOutOfTime(self):
+        (v, written) = self.estimate(charmBudget(0.0, clock=fakeClock(0.05)))
+        self.assertEqual(v.budget.unreached(), 2)
+        self.assertEqual(len(v.stats), 0)
+        self.assertEqual(written, set())
@@ -0,0 +1,103 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+from estimatecharm.charmCluster import *
+
+import os, socket
+from multiprocessing import Process, get_context
+from charmTestCase import targetFileCase
+
+class testCharmCluster(targetFileCase):
+    def setUp(self):
+        targetFileCase.setUp(self)
+        self.v = estimateCharm(source=[self.path], tempDir=self.tempDir)
+    def tearDown(self):
+        self.v.release()
+        targetFileCase.tearDown(self)
+    def testRequeue(self):
+        work = workQueue()
+        work.put(dict(path="a"))
+        work.put(dict(path="b"))
+        first = work.take(0)
+        work.requeue(first['id'])
+        self.assertEqual(work.take(0)['path'], "a")
+        work.finish(first['id'], [])
+        work.finish(first['id'], [])
+        self.assertEqual(work.results.qsize(), 1)
+        self.assertEqual(work.cancel("b"), 1)
+        self.assertEqual(work.take(0), None)
+    def testUnitsCarryDigests(self):
+        coordinator = charmCoordinator(self.v, unitSize=2)
+        fi = next(iter(self.v.corpus))
+        units = coordinator.units(fi, self.v.fileStats(fi), REPLACE, 1.0)
+        self.assertTrue(len(units) > 0)
+        for unit in units:
+            self.assertEqual(unit['digest'], fi.digest)
+            self.assertFalse('source' in unit or 'baseline' in unit)
+    def testLocalWorkers(self):
+        coordinator = charmCoordinator(self.v, heartbeatTimeout=2.0, poll=0.1, unitSize=2)
+        coordinator.start()
+        # A worker that takes a unit and then goes quiet, to be requeued.
+        lost = socket.create_connection(coordinator.address)
+        workers = [Process(target=runWorker, args=(coordinator.address,)) for i in range(0, 2)]
+        try:
+            sendMessage(lost, dict(type='ready'))
+            for worker in workers:
+                worker.start()
+            coordinator.estimate(REPLACE, 1.0)
+        finally:
+            coordinator.release()
+            lost.close()
+            for worker in workers:
+                worker.join()
+        # Sources are only kept while their files have units out.
+        self.assertEqual(coordinator.work.sources, dict())
+        stats = self.v.stats[self.path]
+        self.assertEqual(stats.mutations, stats.lines)
+        self.assertEqual(sum(stats.progress), stats.mutations)
+        self.assertEqual(stats.needed(1.0), 0)
+    def testSpawnedWorkers(self):
+        # Workers get only picklable arguments, so they start without fork too.
+        coordinator = charmCoordinator(self.v, poll=0.1, unitSize=2)
+        coordinator.start()
+        spawn = get_context("spawn")
+        workers = [spawn.Process(target=runWorker,
+                                 args=(coordinator.address, dict(kind="process", timeout=5), None,
+                                       pythonSource, dict(ahead=2, inferUnreached=True)))
+                   for i in range(0, 2)]
+        try:
+            for worker in workers:
+                worker.start()
+            coordinator.estimate(REPLACE, 1.0)
+        finally:
+            coordinator.release()
+            for worker in workers:
+                worker.join()
+        stats = self.v.stats[self.path]
+        self.assertEqual(sum(stats.progress), stats.mutations)
+        self.assertEqual(stats.needed(1.0), 0)
+    def testNoWorkersLeft(self):
+        coordinator = charmCoordinator(self.v, poll=0.1, abandon=0.5)
+        coordinator.start()
+        try:
+            self.assertRaises(RuntimeError, coordinator.estimate, REPLACE, 1.0)
+        finally:
+            coordinator.release()
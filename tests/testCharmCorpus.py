@@ -0,0 +1,71 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.charmCorpus import *
+
+import os, shutil
+from tempfile import mkdtemp
+
+class testCharmCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = mkdtemp()
+        for name in ["b.py", "a.py", "notes.txt", os.path.join("sub", "c.py")]:
+            path = os.path.join(self.tempDir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.mkdir(os.path.dirname(path))
+            open(path, "w").close()
+        self.listFile = os.path.join(self.tempDir, "list.txt")
+        with open(self.listFile, "w") as f:
+            f.write("one.py\n\ntwo.py\n")
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+    def testWalk(self):
+        paths = list(corpusPaths([self.tempDir]))
+        self.assertEqual([os.path.relpath(p, self.tempDir) for p in paths],
+                          ["a.py", "b.py", os.path.join("sub", "c.py")])
+        self.assertEqual(len(list(corpusPaths([self.tempDir], ["*.txt"]))), 2)
+    def testListFile(self):
+        self.assertEqual(list(corpusPaths(["zero.py", "@" + self.listFile])),
+                          ["zero.py", "one.py", "two.py"])
+    def testLazyWindow(self):
+        loaded = []
+        def load(path):
+            loaded.append(path)
+            return None if path == "skip" else path
+        corpus = charmCorpus(load, window=2)
+        corpus.add(iter(["a", "skip", "b", "c", "d"]))
+        it = iter(corpus)
+        self.assertEqual(loaded, [])
+        self.assertEqual(next(it), "a")
+        self.assertEqual(loaded, ["a", "skip", "b"])
+        self.assertEqual(list(it), ["b", "c", "d"])
+    def testPoolSkips(self):
+        corpus = charmCorpus(lambda path: None if path.startswith("skip") else path,
+                             window=1, concurrency=2)
+        corpus.add(iter(["a", "skip1", "b", "skip2", "skip3", "c"]))
+        self.assertEqual(list(corpus), ["a", "b", "c"])
+    def testBaselineCacheKey(self):
+        path = os.path.join(self.tempDir, "baselines.jsonl")
+        baselineCache(path).put(dict(digest="d", path="a.py", activate=None, modules=[]))
+        cache = baselineCache(path)
+        self.assertEqual(cache.get("d", "a.py")['modules'], [])
+        self.assertEqual(cache.get("d", "b.py"), None)
+        self.assertEqual(cache.get("d", "a.py", "env/bin/activate_this.py"), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
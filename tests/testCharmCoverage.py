@@ -0,0 +1,72 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.charmCoverage import *
+from estimatecharm.mutantExecutor import processExecutor, sourceEdit
+
+import os, shutil
+from tempfile import mkdtemp
+
+source = """def called(x):
+    return x + 1
+
+def uncalled(x):
+    return x - 1
+
+class Thing(object):
+    size = called(1)
+    def method(self, y=2):
+        return y
+
+value = called(2)
+"""
+
+class testCharmCoverage(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = mkdtemp()
+        self.path = os.path.join(self.tempDir, "covered.py")
+        with open(self.path, "w") as f:
+            f.write(source)
+        (r, modules, executed) = processExecutor().baseline(self.path)
+        self.executed = frozenset(executed)
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+    def unreached(self, mutant):
+        return unreached(source, self.path, self.executed, sourceEdit(source, mutant))
+    def testExecuted(self):
+        self.assertEqual(sorted(self.executed), [1, 2, 4, 7, 8, 9, 12])
+    def testUnreached(self):
+        self.assertTrue(self.unreached(source.replace("x - 1", "x * 1")))
+        self.assertTrue(self.unreached(source.replace("return y", "return z")))
+        # Reached, doesn't compile, or evaluated when the class is defined.
+        self.assertFalse(self.unreached(source.replace("x + 1", "x * 1")))
+        self.assertFalse(self.unreached(source.replace("x - 1", "x - ")))
+        self.assertFalse(self.unreached(source.replace("y=2", "y=3")))
+    def testSignatures(self):
+        base = "x = 1\n\ndef f(z):\n    if z == 2:\n        y = 2\n    return x\n\nf(1)\n"
+        executed = frozenset([1, 3, 4, 6, 8])
+        def inferred(mutant):
+            return unreached(base, self.path, executed, sourceEdit(base, mutant))
+        self.assertTrue(inferred(base.replace("y = 2", "y = 3")))
+        # x becomes local to f, which ran, or f a generator.
+        self.assertFalse(inferred(base.replace("y = 2", "x = 2")))
+        self.assertFalse(inferred(base.replace("y = 2", "yield 2")))
+        # Neither matters to a function that never ran.
+        self.assertTrue(self.unreached(source.replace("return x - 1", "yield x")))
@@ -0,0 +1,81 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+
+import os, shutil, csv, time
+from charmTestCase import targetFileCase
+
+class testCharmDedup(targetFileCase):
+    def setUp(self):
+        targetFileCase.setUp(self)
+        self.paths = [self.write(name) for name in ("a.py", "b.py", "c.py")]
+        self.empty = os.path.join(self.tempDir, "__init__.py")
+        self.copy = os.path.join(self.tempDir, "copy", "__init__.py")
+        os.mkdir(os.path.dirname(self.copy))
+        for p in (self.empty, self.copy):
+            open(p, "w").close()
+        self.historyPath = os.path.join(self.tempDir, "history.json")
+    def estimate(self, results=None):
+        v = estimateCharm(source=self.paths + [self.empty, self.copy], tempDir=self.tempDir,
+                          results=results, details=None,
+                          history=charmHistory(self.historyPath))
+        try:
+            v.estimate(REPLACE, 0.5)
+        finally:
+            v.release()
+        return v
+    def testDuplicates(self):
+        resultsPath = os.path.join(self.tempDir, "charm.csv")
+        v = self.estimate(resultsPath)
+        self.assertEqual(sorted(v.stats.keys()), self.paths)
+        first = v.stats[self.paths[0]]
+        self.assertEqual(v.metrics.mutants, first.mutations)
+        for p in self.paths[1:]:
+            self.assertEqual(list(v.stats[p].progress), list(first.progress))
+        self.assertEqual(sum(len(waiting) for waiting in v.copies.values()), 1)
+        with open(resultsPath + ".new") as results:
+            rows = list(csv.reader(results))[1:]
+        self.assertEqual(sorted(set(row[0] for row in rows)), self.paths)
+    def testHistoryByContent(self):
+        self.estimate()
+        self.paths.append(os.path.join(self.tempDir, "d.py"))
+        shutil.copyfile(self.paths[0], self.paths[-1])
+        self.paths = self.paths[::-1]
+        v = self.estimate()
+        self.assertEqual(v.metrics.mutants, 0)
+        self.assertEqual(v.history.unchanged, 1)
+        self.assertEqual(list(v.stats[self.paths[0]].progress), list(v.stats[self.paths[-1]].progress))
+    def testCopyLoadedFirst(self):
+        class slowFirst(estimateCharm):
+            def loadCharmFile(self, fi, source=None):
+                if fi[0] == "a.py":
+                    time.sleep(0.5)
+                return estimateCharm.loadCharmFile(self, fi, source)
+        source = "def f(x):\n    return x + 1\n\ny = f(2)\n"
+        v = slowFirst(source=[("a.py", source), ("b.py", source)], tempDir=self.tempDir,
+                      window=2, baselineJobs=2)
+        try:
+            finished = [stats.path for stats in v.estimating(REPLACE, 0.5)]
+        finally:
+            v.release()
+        self.assertEqual(sorted(finished), ["a.py", "b.py"])
+        self.assertEqual(list(v.digests.values()), ["b.py"])
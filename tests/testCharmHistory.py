@@ -0,0 +1,86 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+from estimatecharm.charmHistory import lineHashes
+
+import os
+from charmTestCase import targetFileCase, targetSource
+
+class testCharmHistory(targetFileCase):
+    def setUp(self):
+        targetFileCase.setUp(self)
+        self.write(self.path, targetSource + "z = f(y)\n")
+        self.other = self.write("other.py", "a = 1\nb = a + 2\n")
+        self.historyPath = os.path.join(self.tempDir, "history.json")
+    def estimate(self):
+        v = estimateCharm(source=[self.path, self.other], tempDir=self.tempDir,
+                          results=None, details=None,
+                          history=charmHistory(self.historyPath))
+        try:
+            v.estimate(REPLACE, 0.5)
+        finally:
+            v.release()
+        return v
+    def testLineHashes(self):
+        self.assertEqual(len(lineHashes("a\nb\n\nc")), 4)
+        self.assertEqual(lineHashes("a\nb\n")[0], lineHashes("a\nc\n")[0])
+    def testIncremental(self):
+        first = self.estimate()
+        before = first.stats[self.path]
+        self.assertEqual(first.metrics.mutants, before.mutations + first.stats[self.other].mutations)
+        # Insert a line above the last one and change the one after it.
+        self.write(self.path, "def f(x):\n    return x + 1\n\nw = 3\ny = f(w)\nz = f(y)\n")
+        second = self.estimate()
+        self.assertEqual(second.history.unchanged, 1)
+        self.assertEqual(second.history.changed, 1)
+        self.assertEqual(list(second.stats[self.other].progress), list(first.stats[self.other].progress))
+        after = second.stats[self.path]
+        # Unchanged lines keep their mutants, the changed ones get new ones.
+        self.assertTrue(after.progress[1] >= before.progress[1])
+        self.assertTrue(after.progress[2] >= before.progress[2])
+        self.assertTrue(after.progress[6] >= before.progress[5])
+        self.assertTrue(after.progress[4] > 0)
+        self.assertTrue(after.progress[5] > 0)
+        self.assertTrue(second.metrics.mutants < before.mutations)
+        self.assertTrue(after.delta <= 0.5)
+        # Every kept error is from a kept mutant.
+        self.assertEqual(sum(after.errors), after.mutations)
+        self.assertEqual(sum(after.lineErrors.values()), after.mutations)
+        third = self.estimate()
+        self.assertEqual(third.history.unchanged, 2)
+        self.assertEqual(third.metrics.mutants, 0)
+        with open(self.historyPath) as f:
+            self.assertEqual(len(f.readlines()), 2)
+    def testCarryWithoutLineErrors(self):
+        self.estimate()
+        history = charmHistory(self.historyPath)
+        entry = dict(history.entries[self.path])
+        del entry['lineErrors']
+        entry['progress'] = [0, 4, 4, 0, 4, 4, 0, 0]
+        entry['errors'] = [0, 2, 2, 0, 6, 2, 0, 4]
+        history.put(entry)
+        self.write(self.path, "def f(x):\n    return x + 1\n\ny = f(3)\nz = f(y)\n")
+        fi = charmFile(self.path, pythonSource, self.tempDir)
+        stats = history.carry(fi)
+        # Line 4 changed: 12 of 16 mutants kept, so errors shrink by a quarter.
+        self.assertEqual(list(stats.progress), [0, 4, 4, 0, 0, 4, 0, 0])
+        self.assertEqual(list(stats.errors), [0, 2, 2, 0, 0, 2, 0, 3])
+        self.assertEqual(stats.lineErrors, None)
@@ -0,0 +1,96 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+from estimatecharm.charmMakers import *
+from estimatecharm.mutantExecutor import applyEdit
+
+import os, random, threading
+from itertools import islice
+from charmTestCase import targetFileCase
+
+class testCharmMakers(targetFileCase):
+    def setUp(self):
+        targetFileCase.setUp(self)
+        self.v = estimateCharm(source=[], tempDir=self.tempDir)
+        self.fi = self.v.loadCharmFile(self.path)
+    def tearDown(self):
+        self.v.release()
+        targetFileCase.tearDown(self)
+    def testAhead(self):
+        made = list()
+        def items():
+            for i in range(0, 100):
+                made.append(i)
+                yield i
+        threads = threading.active_count()
+        stream = ahead(items(), 4)
+        self.assertEqual(list(islice(stream, 10)), list(range(0, 10)))
+        # Bounded: only what was taken, what's queued and one in hand.
+        self.assertTrue(len(made) <= 10 + 4 + 1)
+        stream.close()
+        self.assertEqual(threading.active_count(), threads)
+        def failing():
+            yield 1
+            raise ValueError("can't")
+        stream = ahead(failing(), 4)
+        self.assertEqual(next(stream), 1)
+        self.assertRaises(ValueError, next, stream)
+    def made(self, makers):
+        random.seed(5)
+        lines = list(islice(self.v.mutationLines(self.fi), 12))
+        return list(madeElsewhere(self.v, self.fi, REPLACE, lines, makers, 4))
+    def testMadeElsewhere(self):
+        made = self.made(3)
+        self.assertEqual(len(made), 12)
+        self.assertEqual(made, self.made(3))
+        for (kind, mutant) in made:
+            self.assertTrue(kind in ("edit", "inferred"))
+    def testEdits(self):
+        base = self.fi.base
+        for (mutation, at) in [(DELETE, self.v.deleteAt), (REPLACE, self.v.replaceAt)]:
+            space = self.v.space(self.fi, mutation)
+            for i in range(0, space.size):
+                (pos, token) = space[i]
+                ls = copy(self.fi.scrubbed)
+                ls.pop(pos)
+                if mutation is REPLACE:
+                    ls.insert(pos, token)
+                at(self.fi, i)
+                (edit, location) = self.fi.takeEdit()
+                self.assertEqual(applyEdit(base, edit), ls.deLex())
+                if mutation is DELETE and self.fi.scrubbed[pos].type != 'NEWLINE':
+                    # Only the rest of the token's line is laid out again.
+                    self.assertTrue("\n" not in base[edit[0]:edit[0]+edit[1]])
+        # Character mutants are edits of the original text instead.
+        charPos = self.v.space(self.fi, PUNCTUATION)[0][0]
+        self.v.punctAt(self.fi, 0)
+        (source, location) = self.fi.takeMutant()
+        self.assertEqual(source, self.fi.original[:charPos] + self.fi.original[charPos+1:])
+        outcomes = list(self.v.outcomes(self.fi, estimateCharm.punctAt, [0]))
+        self.assertEqual(len(outcomes), 1)
+    def testOutcomes(self):
+        for (ahead, makers) in [(0, 0), (4, 0), (4, 2)]:
+            self.v.ahead = ahead
+            self.v.makers = makers
+            lines = islice(self.v.mutationLines(self.fi), 10)
+            outcomes = list(self.v.outcomes(self.fi, REPLACE, lines))
+            self.assertEqual(len(outcomes), 10)
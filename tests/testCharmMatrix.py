@@ -0,0 +1,55 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+from estimatecharm.charmMatrix import readNpz, writeNpz
+
+import os
+from array import array
+from charmTestCase import targetFileCase
+
+class testCharmMatrix(targetFileCase):
+    def testNpz(self):
+        path = os.path.join(self.tempDir, "t.npz")
+        writeNpz(path, dict(n=array('l', [1, -2, 3]), s=["ab", "", "c"]))
+        arrays = readNpz(path)
+        self.assertEqual(list(arrays["n"]), [1, -2, 3])
+        self.assertEqual(arrays["s"], ["ab", "", "c"])
+    def testMatrix(self):
+        target = self.path
+        path = os.path.join(self.tempDir, "charm.npz")
+        v = estimateCharm(source=[target], tempDir=self.tempDir, matrix=path)
+        try:
+            v.estimate(REPLACE, 0.5)
+        finally:
+            v.release()
+        stats = v.stats[target]
+        m = readNpz(path)
+        self.assertEqual(m["files"], [target])
+        self.assertEqual(list(m["lines"]), [stats.lines])
+        self.assertEqual(sum(m["count"]), stats.mutations)
+        progress = [0] * (stats.lines + 2)
+        errors = [0] * (stats.lines + 2)
+        for (mutLine, errorLine, count) in zip(m["mutLine"], m["errorLine"], m["count"]):
+            progress[mutLine] += count
+            errors[errorLine] += count
+        self.assertEqual(progress, list(stats.progress))
+        self.assertEqual(errors, list(stats.errors))
+        self.assertEqual(max(m["exception"]), len(m["exceptions"]) - 1)
@@ -0,0 +1,65 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+
+import os
+try:
+  from urllib.request import urlopen
+except ImportError:
+  from urllib2 import urlopen
+from charmTestCase import targetFileCase
+
+class testCharmMetrics(targetFileCase):
+    def setUp(self):
+        targetFileCase.setUp(self)
+        self.v = estimateCharm(source=[self.path], tempDir=self.tempDir)
+    def tearDown(self):
+        self.v.release()
+        targetFileCase.tearDown(self)
+    def metric(self, text, name):
+        for line in text.splitlines():
+            if line.startswith("estimatecharm_" + name + " "):
+                return float(line.split()[1])
+    def testClosedEarly(self):
+        v = estimateCharm(source=[], tempDir=self.tempDir,
+                          executor=zygoteExecutor(store=tempFileStore(self.tempDir), maxBatch=8))
+        try:
+            fi = v.loadCharmFile(self.path)
+            for i in range(0, 3):
+                outcomes = v.outcomes(fi, REPLACE, islice(v.mutationLines(fi), 20))
+                next(outcomes)
+                outcomes.close()
+                self.assertEqual(v.metrics.inFlight, 0)
+        finally:
+            v.release()
+    def testMetrics(self):
+        metricsFile = os.path.join(self.tempDir, "metrics.prom")
+        self.v.metrics.serve(metricsFile, 0, 0.05)
+        self.v.estimate(REPLACE, 1.0)
+        served = urlopen("http://127.0.0.1:%i/metrics" % self.v.metrics.server.server_address[1]).read().decode('utf-8')
+        stats = self.v.stats[self.path]
+        self.assertEqual(self.metric(served, "mutants_total"), stats.mutations)
+        self.assertEqual(self.metric(served, "in_flight"), 0)
+        self.assertEqual(self.metric(served, "files_done_total"), 1)
+        self.assertEqual(self.metric(served, "baseline_cache_misses_total"), 1)
+        self.v.metrics.stop()
+        with open(metricsFile) as f:
+            self.assertEqual(self.metric(f.read(), "mutants_total"), stats.mutations)
@@ -0,0 +1,46 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+from estimatecharm.charmProfile import memoryProfiler
+
+import os
+from charmTestCase import targetFileCase
+
+class testCharmProfile(targetFileCase):
+    def setUp(self):
+        targetFileCase.setUp(self)
+        self.report = os.path.join(self.tempDir, "memory.txt")
+        self.v = estimateCharm(source=[self.path], tempDir=self.tempDir,
+                               profiler=memoryProfiler(self.report, every=5))
+    def tearDown(self):
+        self.v.release()
+        targetFileCase.tearDown(self)
+    def testProfile(self):
+        self.v.estimate(REPLACE, 1.0)
+        self.v.release()
+        with open(self.report) as f:
+            report = f.read()
+        self.assertTrue("== loaded " + self.path in report)
+        self.assertTrue("== finished " + self.path in report)
+        self.assertTrue("== 5 mutants" in report)
+        self.assertTrue("== end" in report)
+        self.assertTrue("charmCorpus." in report or "pythonSource." in report)
+        self.assertTrue("GROWTH" in report)
@@ -0,0 +1,81 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.estimateCharm import *
+from estimatecharm.charmSpace import *
+
+import os, random
+from charmTestCase import targetFileCase
+
+class testCharmSpace(targetFileCase):
+    def estimate(self, mutation, deltamax, exhaustive):
+        v = estimateCharm(source=[self.path], tempDir=self.tempDir, exhaustive=exhaustive)
+        try:
+            v.estimate(mutation, deltamax)
+        finally:
+            v.release()
+        return v.stats[self.path]
+    def testShuffled(self):
+        self.assertEqual(sorted(shuffled(range(5, 105))), list(range(5, 105)))
+    def testSample(self):
+        space = mutantSpace([0, 1, 2, 5], [1, 1, 2, 4], ["a", "b"])
+        self.assertEqual(space[5], (2, "b"))
+        self.assertEqual(list(space.lineRanges()), [(1, range(0, 4)), (2, range(4, 6)), (4, range(6, 8))])
+        sample = list(space.sample(9))
+        # Round robin over the lines, so each line gets one of every three.
+        for start in range(0, 9, 3):
+            self.assertEqual(sorted(space.lines[i // 2] for i in sample[start:start+3]), [1, 2, 4])
+        # A line's mutants come again only once they have all come.
+        self.assertEqual(len(set(sample[0::3])), 3)
+        self.assertEqual(sorted(sample[1::3][0:2]), [4, 5])
+    def testCharSpace(self):
+        source = "a:\n b:\nc"
+        space = charSpace(source, colon)
+        self.assertEqual(space.positions, [1, 5])
+        self.assertEqual(space.lines, [1, 2])
+        # A character starting a line is said to be on the one before.
+        self.assertEqual(charSpace(source, name).lines, [2, 2])
+    def testReplaceOnLine(self):
+        v = estimateCharm(source=[], tempDir=self.tempDir)
+        try:
+            fi = v.loadCharmFile(self.path)
+            offsets = set()
+            for i in range(0, 50):
+                v.replaceRandom(fi, 2)
+                (edit, location) = fi.takeEdit()
+                offsets.add(edit[0])
+            # Any token of the line is replaced, not just its first.
+            self.assertTrue(len(offsets) > 1)
+            self.assertEqual(fi.lineTokens[fi.lines], 0)
+        finally:
+            v.release()
+    def testSampleLikeSampling(self):
+        # Sampling without replacement estimates what sampling does.
+        random.seed(3)
+        sampled = self.estimate(REPLACE, 0.15, "sample")
+        drawn = self.estimate(REPLACE, 0.15, "off")
+        for line in range(1, sampled.lines+1):
+            self.assertTrue(abs(sampled.charm[line] - drawn.charm[line]) < 2 * drawn.delta,
+                            (line, sampled.charm[line], drawn.charm[line]))
+        self.assertTrue(sampled.delta <= 0.15)
+    def testSampleDelete(self):
+        stats = self.estimate(DELETE, 0.5, "sample")
+        self.assertTrue(stats.delta <= 0.5)
@@ -0,0 +1,298 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.mutantExecutor import *
+from estimatecharm.mutantChild import unsafeModules
+
+import os, shutil, time
+from tempfile import mkdtemp
+
+class testMutantExecutor(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = mkdtemp()
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+    def write(self, name, code):
+        path = os.path.join(self.tempDir, name)
+        with open(path, "w") as f:
+            f.write(code)
+        return path
+    def testExecuteSyntaxError(self):
+        path = self.write("bad.py", "x = (\n")
+        r = executeFile(path)
+        self.assertEqual(r[0].__name__, "SyntaxError")
+        self.assertEqual(r[2][-1][0], path)
+    def testPackCustomException(self):
+        Custom = type("Custom", (Exception,), dict(__module__="<run_path>"))
+        r = unpackResult(packResult((Custom, "boom", [("a.py", 1, "f", None)])))
+        self.assertEqual(r[0].__name__, "Custom")
+        self.assertEqual(r[2], [("a.py", 1, "f", None)])
+        self.assertTrue(unpackResult(packResult((KeyError, "k", [])))[0] is KeyError)
+    def testBaselineModules(self):
+        path = self.write("imports.py", "import colorsys\n")
+        (r, modules, executed) = processExecutor().baseline(path)
+        self.assertEqual(r[0], None)
+        self.assertTrue("colorsys" in modules)
+    def testZygote(self):
+        good = self.write("good.py", "import colorsys\n")
+        bad = self.write("bad.py", "import colorsys\ncolorsys.nope\n")
+        loop = self.write("loop.py", "while True:\n    pass\n")
+        z = zygoteExecutor(timeout=1)
+        z.start()
+        try:
+            self.assertEqual(z.run(good, ["colorsys"])[0], None)
+            r = z.run(bad, ["colorsys"])
+            self.assertEqual(r[0], AttributeError)
+            self.assertEqual(r[2][-1][0], bad)
+            self.assertEqual(r[2][-1][1], 2)
+            self.assertEqual(z.run(loop)[0], HaltingError)
+        finally:
+            z.release()
+    def testZygotePreloadOnce(self):
+        good = self.write("good.py", "import colorsys\n")
+        z = zygoteExecutor(timeout=1)
+        z.start()
+        sent = list()
+        def send(message, send=z.conn.send):
+            sent.append(message[1])
+            send(message)
+        z.conn.send = send
+        try:
+            for preload in (["colorsys"], ["colorsys"], ["colorsys", "json"], ["colorsys", "json"]):
+                self.assertEqual(z.run(good, preload)[0], None)
+            self.assertEqual(sent, [["colorsys"], None, ["colorsys", "json"], None])
+        finally:
+            z.release()
+    def testZygoteBatches(self):
+        z = zygoteExecutor(timeout=1, store=tempFileStore(self.tempDir), maxBatch=4)
+        z.start()
+        try:
+            mutants = [("x = %i\n" % i, i) for i in range(0, 9)]
+            mutants.append(("x = 1\nx.nope\n", "bad"))
+            results = list(z.stream(mutants))
+            self.assertEqual([tag for (tag, path, r) in results], list(range(0, 9)) + ["bad"])
+            (tag, path, r) = results[-1]
+            self.assertEqual(r[0], AttributeError)
+            self.assertEqual(r[2], [(path, 2, "<module>", "x.nope")])
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(1 <= z.batchSize <= 4)
+        finally:
+            z.release()
+    def testZygoteEdits(self):
+        base = "x = 1\ny = x\n"
+        self.assertEqual(sourceEdit(base, "x = 1\ny + x\n"), (8, 1, "+"))
+        self.assertEqual(applyEdit(base, (8, 1, "+")), "x = 1\ny + x\n")
+        for store in (tempFileStore(self.tempDir), openMutantStore("memfd")):
+            z = zygoteExecutor(timeout=1, store=store)
+            z.start()
+            try:
+                edits = [(sourceEdit(base, "x = 1\ny = x\n"), "same"),
+                         (sourceEdit(base, "x = 1\ny = x.nope\n"), "bad")]
+                results = list(z.streamEdits(base, edits))
+                self.assertEqual(results[0][2][0], None)
+                self.assertEqual(results[1][2][0], AttributeError)
+                self.assertEqual(results[1][2][2][0][1], 2)
+            finally:
+                z.release()
+            self.assertEqual(z.shared, None)
+    def testActivationOncePerWorker(self):
+        libDir = os.path.join(self.tempDir, "lib")
+        os.mkdir(libDir)
+        self.write(os.path.join("lib", "venvmod.py"), "MARK = 1\n")
+        activate = self.write("activate_this.py",
+            "import sys, os\nsys.path.insert(0, %r)\nos.environ['VIRTUAL_ENV'] = 'x'\n" % libDir)
+        path = self.write("uses.py", "import venvmod, os\nassert os.environ['VIRTUAL_ENV'] == 'x'\n")
+        p = processExecutor(activate=activate)
+        p.start()
+        self.assertEqual(p.activation['path'][0], libDir)
+        os.remove(activate)
+        self.assertEqual(p.run(path)[0], None)
+    def testMemfdStore(self):
+        store = openMutantStore("memfd")
+        p = processExecutor(timeout=5, store=store)
+        try:
+            (path, r) = p.runMutant("import inspect\nx = 1\nx.nope\n")
+            self.assertEqual(r[0], AttributeError)
+            self.assertEqual(r[2][-1][0], path)
+            self.assertEqual(r[2][-1][1], 3)
+            self.assertEqual(store.fds, dict())
+        finally:
+            p.release()
+    def testAsyncStream(self):
+        try:
+            from estimatecharm.asyncMutantExecutor import asyncExecutor
+        except (ImportError, SyntaxError):
+            return
+        a = asyncExecutor(timeout=2, concurrency=4)
+        a.start()
+        try:
+            mutants = [("x = %i\n" % i, i) for i in range(0, 6)]
+            mutants.append(("class Mine(Exception): pass\nraise Mine()\n", "mine"))
+            mutants.append(("while True:\n    pass\n", "loop"))
+            results = dict((tag, (path, r)) for (tag, path, r) in a.stream(mutants))
+            self.assertEqual(len(results), 8)
+            self.assertEqual(results[3][1][0], None)
+            (path, r) = results["mine"]
+            self.assertEqual(r[0].__name__, "Mine")
+            self.assertEqual(r[2][-1][0], path)
+            self.assertEqual(r[2][-1][1], 2)
+            self.assertEqual(results["loop"][1][0], HaltingError)
+        finally:
+            a.release()
+    def testAsyncRunnerFails(self):
+        try:
+            from estimatecharm.asyncMutantExecutor import asyncExecutor
+        except (ImportError, SyntaxError):
+            return
+        good = self.write("good.py", "x = 1\n")
+        here = os.getcwd()
+        a = asyncExecutor(timeout=10)
+        a.start()
+        try:
+            # Children find estimatecharm without it installed or in the cwd.
+            os.chdir(self.tempDir)
+            self.assertEqual(a.run(good)[0], None)
+            # One that can't run the mutant is an error, not a mutant that
+            # didn't halt.
+            os.mkdir("estimatecharm")
+            self.write("estimatecharm/__init__.py", "")
+            self.write("estimatecharm/mutantChild.py", "import sys\nsys.exit(3)\n")
+            self.assertRaises(RuntimeError, a.run, good)
+        finally:
+            os.chdir(here)
+            a.release()
+    def subinterpreterExecutor(self):
+        try:
+            from estimatecharm.subinterpreterExecutor import subinterpreterExecutor
+        except (ImportError, SyntaxError):
+            self.skipTest("concurrent.interpreters needs Python 3.14 or later")
+        return subinterpreterExecutor
+    def testSubinterpreterAbandoned(self):
+        subinterpreterExecutor = self.subinterpreterExecutor()
+        blocked = self.write("blocked.py", "import time\ntime.sleep(30)\n")
+        e = subinterpreterExecutor(timeout=1)
+        e.start()
+        try:
+            self.assertEqual(e.run(blocked)[0], HaltingError)
+            self.assertEqual(e.abandoned, 1)
+            self.assertFalse(e.interpretable([]))
+        finally:
+            e.release()
+    def testSubinterpreterStream(self):
+        subinterpreterExecutor = self.subinterpreterExecutor()
+        e = subinterpreterExecutor(timeout=2, concurrency=4)
+        e.start()
+        try:
+            mutants = [("x = %i\n" % i, i) for i in range(0, 6)]
+            mutants.append(("class Mine(Exception): pass\nraise Mine()\n", "mine"))
+            mutants.append(("while True:\n    try:\n        pass\n    except BaseException:\n        pass\n", "loop"))
+            results = dict((tag, (path, r)) for (tag, path, r) in e.stream(mutants))
+            self.assertEqual(len(results), 8)
+            self.assertEqual(results[3][1][0], None)
+            (path, r) = results["mine"]
+            self.assertEqual(r[0].__name__, "Mine")
+            self.assertEqual(r[2][-1][0], path)
+            self.assertEqual(r[2][-1][1], 2)
+            self.assertEqual(results["loop"][1][0], HaltingError)
+            self.assertEqual(e.abandoned, 0)
+            self.assertTrue(e.interpretable(["json"]))
+            e.limits = dict(cpu=1)
+            self.assertFalse(e.interpretable(["json"]))
+        finally:
+            e.release()
+    def testUnsafeModules(self):
+        self.assertEqual(unsafeModules(["__main__", "json", "_json", "nonexistent"]), [])
+        self.assertEqual(unsafeModules(["nonexistent.sub"]), [])
+    def executors(self, **kwargs):
+        yield processExecutor(**kwargs)
+        yield zygoteExecutor(**kwargs)
+        try:
+            from estimatecharm.asyncMutantExecutor import asyncExecutor
+        except (ImportError, SyntaxError):
+            return
+        yield asyncExecutor(**kwargs)
+    def testResourceLimits(self):
+        with open("/proc/self/statm") as f:
+            size = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        hog = self.write("hog.py", "x = bytearray(1 << 33)\n")
+        spin = self.write("spin.py", "while True:\n    pass\n")
+        for e in self.executors(timeout=10, limits=dict(memory=size + (256 << 20), cpu=1)):
+            e.start()
+            try:
+                r = e.run(hog)
+                self.assertEqual(r[0], ResourceLimitError)
+                startTime = time.time()
+                r = e.run(spin)
+                self.assertEqual(r[0], ResourceLimitError)
+                self.assertTrue(time.time() - startTime < 5)
+            finally:
+                e.release()
+    def testProcessGroupKilled(self):
+        pidFile = os.path.join(self.tempDir, "pid")
+        forker = self.write("forker.py",
+            "import os, time\npid = os.fork()\nif pid == 0:\n    time.sleep(60)\n    os._exit(0)\n"
+            "with open(%r, 'w') as f:\n    f.write(str(pid))\n" % pidFile)
+        for e in self.executors(timeout=10):
+            e.start()
+            try:
+                startTime = time.time()
+                self.assertEqual(e.run(forker)[0], None)
+                self.assertTrue(time.time() - startTime < 5)
+                with open(pidFile) as f:
+                    pid = int(f.read())
+                time.sleep(0.2)
+                try:
+                    with open("/proc/%i/stat" % pid) as f:
+                        self.assertEqual(f.read().split()[2], "Z")
+                except IOError:
+                    pass
+            finally:
+                e.release()
+    def testMutantOutput(self):
+        noisy = self.write("noisy.py", "import sys, os\nprint('x' * 1000)\nsys.stderr.write('err')\nos.write(1, b'raw')\nprint('tail')\n")
+        sink = os.path.join(self.tempDir, "sink")
+        for e in self.executors(timeout=10):
+            e.start()
+            saved = (os.dup(1), os.dup(2))
+            fd = os.open(sink, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+            try:
+                os.dup2(fd, 1)
+                os.dup2(fd, 2)
+                self.assertEqual(e.run(noisy)[0], None)
+            finally:
+                os.dup2(saved[0], 1)
+                os.dup2(saved[1], 2)
+                for f in saved + (fd,):
+                    os.close(f)
+                e.release()
+            self.assertEqual(os.path.getsize(sink), 0)
+        for e in self.executors(timeout=10, output=16):
+            e.start()
+            try:
+                with self.assertLogs(level='DEBUG') as logs:
+                    r = e.run(noisy)
+                self.assertEqual(len(r), 3)
+                self.assertEqual(r[0], None)
+                output = [line for line in logs.output if "Output of" in line]
+                self.assertEqual(len(output), 1)
+                self.assertTrue(output[0].endswith("errtail\n"))
+                self.assertFalse("x" * 17 in output[0])
+            finally:
+                e.release()
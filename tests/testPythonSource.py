@@ -0,0 +1,49 @@
+#    Copyright 2013, 2014, 2015 Joshua Charles Campbell
+#
+#    This file is part of EstimateCharm.
+#
+#    EstimateCharm is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    EstimateCharm is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with EstimateCharm.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from logging import debug, info, warning, error
+
+from estimatecharm.pythonSource import *
+
+modernPythonCode = 'def f(x) -> int:\n    if (y := x):\n        y @= 2\n    return f"{x!r:>{y}} {{" + ...\n'
+brokenPythonCode = 'def f(:\n  """never closed\n'
+
+class testStdlibPythonSource(unittest.TestCase):
+    def testModernSyntax(self):
+        r = stdlibPythonSource(modernPythonCode)
+        values = [l.value for l in r]
+        for op in ['->', ':=', '@=', '...']:
+            self.assertTrue(op in values)
+        strings = [l for l in r if l.type == 'STRING']
+        self.assertEqual(len(strings), 1)
+        self.assertEqual(strings[0].value, 'f"{x!r:>{y}} {{"')
+        self.assertEqual(str(strings[0]), '<STRING>')
+        self.assertEqual(r.deLex(), modernPythonCode)
+    def testSameAsFlexible(self):
+        with open(__file__) as f:
+            code = f.read()
+        flexible = pythonSource(code)
+        stdlib = stdlibPythonSource(code)
+        self.assertEqual(list(flexible), list(stdlib))
+        scrubbed = stdlib.scrubbed()
+        self.assertTrue(isinstance(scrubbed, stdlibPythonSource))
+        self.assertEqual(scrubbed.deLex(), flexible.scrubbed().deLex())
+    def testFallback(self):
+        r = stdlibPythonSource(brokenPythonCode)
+        self.assertEqual(list(r), list(pythonSource(brokenPythonCode)))
+        self.assertEqual(r[0].value, 'def')